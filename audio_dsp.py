@@ -0,0 +1,107 @@
+import numpy as np
+
+# NumPy DSP for the dub engine: silence detection/removal and a pitch-preserving
+# WSOLA time-stretch. Everything works on float32 mono arrays, no disk round-trips.
+
+def frame_rms_db(samples, frame_len):
+    """RMS level (dBFS) of consecutive non-overlapping frames."""
+    if frame_len <= 0 or len(samples) < frame_len:
+        return np.zeros(0, dtype=np.float32)
+    n_frames = len(samples) // frame_len
+    frames = np.asarray(samples[:n_frames * frame_len]).reshape(n_frames, frame_len).astype(np.float32)
+    if np.issubdtype(np.asarray(samples).dtype, np.integer):
+        frames /= 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return (20.0 * np.log10(np.maximum(rms, 1e-10))).astype(np.float32)
+
+def _window_rms_db(samples, win, hop):
+    """RMS (dBFS) of windows of `win` samples every `hop` samples, via a running sum of squares."""
+    sq = np.concatenate(([0.0], np.cumsum(samples.astype(np.float64) ** 2)))
+    starts = np.arange(0, len(samples) - win + 1, hop)
+    mean_sq = (sq[starts + win] - sq[starts]) / win
+    return starts, 10.0 * np.log10(np.maximum(mean_sq, 1e-20))
+
+def detect_nonsilent(samples, sample_rate, min_silence_len=0.3, silence_thresh=-40.0, hop=0.01):
+    """
+    [(start, end)] sample ranges that are NOT silent. A stretch counts as silent when
+    every window of min_silence_len inside it is below silence_thresh dBFS
+    (same rule as pydub.silence, evaluated every `hop` seconds instead of every 1 ms).
+    """
+    n = len(samples)
+    win = int(min_silence_len * sample_rate)
+    if n == 0: return []
+    if win <= 0 or n < win: return [(0, n)]
+
+    starts, levels = _window_rms_db(samples, win, max(int(hop * sample_rate), 1))
+    silent_starts = starts[levels < silence_thresh]
+    if len(silent_starts) == 0: return [(0, n)]
+
+    # Mark every sample covered by a silent window
+    cover = np.zeros(n + 1, dtype=np.int32)
+    np.add.at(cover, silent_starts, 1)
+    np.add.at(cover, silent_starts + win, -1)
+    silent = np.cumsum(cover[:n]) > 0
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([1], silent.astype(np.int8), [1]))))
+    # edges alternate: nonsilent start, nonsilent end
+    return [(int(a), int(b)) for a, b in zip(edges[::2], edges[1::2])]
+
+def remove_silence(samples, sample_rate, min_silence_len=0.3, silence_thresh=-40.0, keep_silence=0.1):
+    """
+    Drops silent stretches, keeping `keep_silence` seconds around each voiced chunk
+    (split_on_silence + concatenation). Returns the input unchanged if it's all silence.
+    """
+    ranges = detect_nonsilent(samples, sample_rate, min_silence_len, silence_thresh)
+    if not ranges: return samples
+
+    keep = int(keep_silence * sample_rate)
+    padded = [[max(a - keep, 0), min(b + keep, len(samples))] for a, b in ranges]
+    # Overlapping padding: split the shared silence down the middle
+    for k in range(len(padded) - 1):
+        if padded[k][1] > padded[k + 1][0]:
+            mid = (ranges[k][1] + ranges[k + 1][0]) // 2
+            padded[k][1] = padded[k + 1][0] = mid
+    return np.concatenate([samples[a:b] for a, b in padded])
+
+def time_stretch(samples, speed, sample_rate, frame_sec=0.04, tolerance_sec=0.01):
+    """
+    WSOLA time-stretch: speed > 1 makes the clip shorter without changing pitch.
+    Each output frame is taken from around its ideal input position, shifted by up to
+    tolerance_sec to best continue the previous frame (cross-correlation), then
+    overlap-added with a Hann window.
+    """
+    if abs(speed - 1.0) < 1e-3 or len(samples) == 0: return samples
+    from scipy.signal import correlate
+
+    x = np.asarray(samples, dtype=np.float32)
+    n_frame = max(int(frame_sec * sample_rate) // 2 * 2, 4)
+    syn_hop = n_frame // 2
+    ana_hop = syn_hop * speed
+    tol = int(tolerance_sec * sample_rate)
+
+    out_len = int(round(len(x) / speed))
+    n_frames = int(np.ceil(out_len / syn_hop)) + 1
+    pad = tol + n_frame
+    xp = np.concatenate((np.zeros(pad, np.float32), x, np.zeros(pad + n_frame + int(ana_hop) * 2, np.float32)))
+
+    window = np.hanning(n_frame).astype(np.float32)
+    y = np.zeros(n_frames * syn_hop + n_frame, dtype=np.float32)
+    norm = np.zeros_like(y)
+
+    prev = None
+    for k in range(n_frames):
+        ideal = pad + int(round(k * ana_hop))
+        if prev is None:
+            pos = ideal
+        else:
+            # Natural continuation of the previous frame vs. candidates around the ideal position
+            target = xp[prev + syn_hop: prev + syn_hop + n_frame]
+            region = xp[ideal - tol: ideal + tol + n_frame]
+            pos = ideal - tol + int(np.argmax(correlate(region, target, mode="valid")))
+        o = k * syn_hop
+        y[o:o + n_frame] += xp[pos:pos + n_frame] * window
+        norm[o:o + n_frame] += window
+        prev = pos
+
+    y = y / np.maximum(norm, 1e-3)
+    return y[:out_len].astype(np.float32)
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import subprocess
+import tempfile
+import wave
+import numpy as np
+from audio_dsp import frame_rms_db
+
+# One decode per job. Every stage reads views of this buffer.
+SAMPLE_RATE = 24000       # XTTS native rate, also used for reference clips
+WHISPER_SAMPLE_RATE = 16000
+
+def has_audio_stream(video_path):
+    """True/False from ffprobe, None if it couldn't tell (then the decode decides)."""
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "a", "-show_entries", "stream=index",
+           "-of", "csv=p=0", video_path]
+    try: return bool(subprocess.check_output(cmd).strip())
+    except: return None
+
+class AudioSource:
+    """
+    Decodes the audio track of a video ONCE into a memory-mapped int16 (mono) file.
+    Transcription, reference-clip slicing, silence analysis and Docu-Mix all read
+    zero-copy views of the same buffer instead of spawning ffmpeg again.
+    """
+    def __init__(self, video_path, sample_rate=SAMPLE_RATE, scratch_dir=None):
+        self.video_path = video_path
+        self.sample_rate = sample_rate
+        self._owns_file = True
+        self._content_hash = None
+
+        fd, self.pcm_path = tempfile.mkstemp(prefix="reflow_audio_", suffix=".pcm", dir=scratch_dir)
+        os.close(fd)
+        if has_audio_stream(video_path) is False:
+            print(f"   > No audio stream in {os.path.basename(video_path)}")
+        else:
+            try: self._decode()
+            except Exception:
+                self.close()
+                raise
+
+        if os.path.getsize(self.pcm_path) > 0:
+            self.samples = np.memmap(self.pcm_path, dtype=np.int16, mode="r")
+        else:
+            # No audio stream -> empty buffer, stages fall back gracefully
+            self.samples = np.zeros(0, dtype=np.int16)
+
+    def _decode(self):
+        """Raises RuntimeError if ffmpeg fails: a broken decode must not pass for a silent video."""
+        print(f"--- Decoding Audio Once: {os.path.basename(self.video_path)} ---")
+        cmd = [
+            "ffmpeg", "-y", "-v", "error",
+            "-i", self.video_path,
+            "-vn", "-ac", "1", "-ar", str(self.sample_rate),
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            self.pcm_path
+        ]
+        result = subprocess.run(cmd, capture_output=True)
+        if result.returncode != 0:
+            detail = result.stderr.decode(errors="replace").strip().splitlines()
+            raise RuntimeError(f"Audio decode failed for {os.path.basename(self.video_path)}"
+                               + (f": {detail[-1]}" if detail else f" (exit code {result.returncode})"))
+
+    # --- Context Manager ---
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Releases the memmap and deletes the scratch PCM file."""
+        self.samples = np.zeros(0, dtype=np.int16)
+        if self._owns_file and os.path.exists(self.pcm_path):
+            try: os.remove(self.pcm_path)
+            except OSError: pass
+
+    # --- Views ---
+    @property
+    def duration(self):
+        return len(self.samples) / float(self.sample_rate)
+
+    def _index(self, seconds):
+        return min(max(int(round(seconds * self.sample_rate)), 0), len(self.samples))
+
+    def slice(self, start, duration=None):
+        """Zero-copy int16 view of [start, start + duration) seconds."""
+        a = self._index(start)
+        b = len(self.samples) if duration is None else self._index(start + duration)
+        return self.samples[a:max(a, b)]
+
+    def float32(self, start=0.0, duration=None):
+        """Normalized float32 copy (-1..1) of a time range."""
+        return self.slice(start, duration).astype(np.float32) / 32768.0
+
+    def for_whisper(self):
+        """Full track as float32 at 16 kHz, the format model.transcribe() accepts directly."""
+        return resample(self.float32(), self.sample_rate, WHISPER_SAMPLE_RATE).astype(np.float32)
+
+    def write_clip(self, start, duration, out_path):
+        """Writes a slice as a 16-bit mono WAV (no ffmpeg process)."""
+        write_wav(out_path, self.slice(start, duration), self.sample_rate)
+        return out_path
+
+    def content_hash(self):
+        """SHA-256 of the decoded audio stream (computed once, used as a cache key)."""
+        if self._content_hash is None:
+            h = hashlib.sha256(str(self.sample_rate).encode())
+            step = self.sample_rate * 60
+            for a in range(0, len(self.samples), step):
+                h.update(np.ascontiguousarray(self.samples[a:a + step]).tobytes())
+            self._content_hash = h.hexdigest()
+        return self._content_hash
+
+    # --- Analysis ---
+    def frame_rms_db(self, frame_sec=0.05):
+        """Per-frame RMS level in dBFS. Used to find silences without re-decoding."""
+        return frame_rms_db(self.samples, int(self.sample_rate * frame_sec))
+
+
+# --- Helper Functions ---
+def resample(samples, src_rate, dst_rate):
+    """Polyphase resampling (scipy). Returns the input untouched if rates match."""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    from scipy.signal import resample_poly
+    g = np.gcd(int(src_rate), int(dst_rate))
+    return resample_poly(samples, int(dst_rate) // g, int(src_rate) // g)
+
+def to_int16(samples):
+    """Float (-1..1) or int16 array -> int16 with clipping."""
+    samples = np.asarray(samples)
+    if samples.dtype == np.int16:
+        return samples
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+
+def write_wav(path, samples, sample_rate, channels=1):
+    samples = to_int16(samples)
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(np.ascontiguousarray(samples).tobytes())
+    return path
+
+def read_wav(path):
+    """Returns (int16 samples shaped (n, channels), sample_rate)."""
+    with wave.open(path, "rb") as wf:
+        sr = wf.getframerate()
+        ch = wf.getnchannels()
+        data = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    return data.reshape(-1, ch), sr
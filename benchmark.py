@@ -0,0 +1,533 @@
+"""
+ReFlow performance benchmarks.
+Usage: python benchmark.py <suite> [options]   (python benchmark.py -h for the list)
+"""
+import argparse
+import math
+import re
+import time
+from collections import Counter
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+def _print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    line = "  ".join(str(h).ljust(w) for h, w in zip(headers, widths))
+    print(line)
+    print("-" * len(line))
+    for r in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(r, widths)))
+
+def word_error_rate(reference, hypothesis):
+    """Word-level Levenshtein distance / reference length (case and punctuation ignored)."""
+    norm = lambda t: re.sub(r"[^\w\s']", " ", t.lower()).split()
+    ref, hyp = norm(reference), norm(hypothesis)
+    if not ref: return 0.0 if not hyp else 1.0
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1] / len(ref)
+
+def _ngrams(items, n):
+    return Counter(tuple(items[i:i + n]) for i in range(len(items) - n + 1))
+
+def corpus_bleu(references, hypotheses, max_n=4):
+    """Corpus BLEU (0-100) on whitespace tokens, uniform weights, brevity penalty."""
+    matches, totals = [0] * max_n, [0] * max_n
+    ref_len = hyp_len = 0
+    for ref, hyp in zip(references, hypotheses):
+        r, h = ref.split(), hyp.split()
+        ref_len += len(r)
+        hyp_len += len(h)
+        for n in range(1, max_n + 1):
+            rc, hc = _ngrams(r, n), _ngrams(h, n)
+            matches[n - 1] += sum(min(c, rc[g]) for g, c in hc.items())
+            totals[n - 1] += max(len(h) - n + 1, 0)
+    if hyp_len == 0 or min(matches) == 0: return 0.0
+    log_p = sum(math.log(m / t) for m, t in zip(matches, totals)) / max_n
+    bp = 1.0 if hyp_len > ref_len else math.exp(1 - ref_len / hyp_len)
+    return 100.0 * bp * math.exp(log_p)
+
+def corpus_chrf(references, hypotheses, max_n=6, beta=2.0):
+    """chrF (0-100): character n-gram F-score averaged over n=1..6, spaces removed."""
+    precisions, recalls = [], []
+    for n in range(1, max_n + 1):
+        match = hyp_total = ref_total = 0
+        for ref, hyp in zip(references, hypotheses):
+            rc, hc = _ngrams(ref.replace(" ", ""), n), _ngrams(hyp.replace(" ", ""), n)
+            match += sum(min(c, rc[g]) for g, c in hc.items())
+            hyp_total += sum(hc.values())
+            ref_total += sum(rc.values())
+        precisions.append(match / hyp_total if hyp_total else 0.0)
+        recalls.append(match / ref_total if ref_total else 0.0)
+    p, r = sum(precisions) / max_n, sum(recalls) / max_n
+    if p + r == 0: return 0.0
+    return 100.0 * (1 + beta ** 2) * p * r / (beta ** 2 * p + r)
+
+def _parse_specs(text):
+    """'whisper:base:float32,whisper-int8:small:int8' -> [BackendSpec, ...]"""
+    import transcriber
+    specs = []
+    for item in text.split(","):
+        parts = item.strip().split(":")
+        parts += ["base", "auto"][len(parts) - 1:]
+        specs.append(transcriber.BackendSpec(*parts[:3]))
+    return specs
+
+# --- Suites ---
+def bench_transcribe(args):
+    """Throughput of chunked transcription vs. worker count."""
+    import transcriber
+    from audio_source import AudioSource
+
+    worker_counts = [int(x) for x in args.workers.split(",")]
+    spec = transcriber.BackendSpec(args.backend, args.model, args.compute_type)
+    rows = []
+    with AudioSource(args.video) as source:
+        print(f"   > Audio: {source.duration:.1f}s")
+        for workers in worker_counts:
+            # Warm up every worker so model loading isn't counted
+            list(transcriber.get_pool(spec, workers).map(time.sleep, [1.0] * workers))
+            segs, elapsed = _timed(transcriber.transcribe_chunked, source, spec=spec,
+                                   workers=workers, chunk_sec=args.chunk_sec)
+            rows.append([workers, len(segs), f"{elapsed:.1f}s", f"{source.duration / elapsed:.2f}x"])
+            transcriber.shutdown_pools()
+
+    _print_table(["workers", "segments", "wall", "realtime"], rows)
+
+def bench_asr(args):
+    """Speed vs. WER of transcription backends on a local fixture (audio/video + reference .txt)."""
+    import transcriber
+    from audio_source import AudioSource
+
+    with open(args.reference, "r", encoding="utf-8") as f:
+        reference = f.read()
+
+    rows = []
+    with AudioSource(args.fixture) as source:
+        audio = source.for_whisper()
+        prompt = transcriber.build_initial_prompt()
+        for spec in _parse_specs(args.configs):
+            backend, load_time = _timed(transcriber.load_model, spec, device=args.device)
+            raw, elapsed = _timed(backend.transcribe, audio, prompt)
+            hypothesis = " ".join(s['text'].strip() for s in raw)
+            rows.append([transcriber.spec_id(backend.spec), f"{load_time:.1f}s", f"{elapsed:.1f}s",
+                         f"{source.duration / elapsed:.2f}x", f"{word_error_rate(reference, hypothesis) * 100:.1f}%"])
+            del backend
+
+    _print_table(["backend", "load", "transcribe", "realtime", "WER"], rows)
+
+
+def _read_lines(path, limit=None):
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [l.strip() for l in f if l.strip()]
+    return lines[:limit] if limit else lines
+
+def bench_translate(args):
+    """NLLB segments/second at different batch sizes (run with CUDA_VISIBLE_DEVICES= for CPU)."""
+    import translation
+
+    texts = _read_lines(args.fixture, args.limit)
+    translator, load_time = _timed(translation.NLLBTranslator)
+    print(f"   > {len(texts)} segments, model loaded in {load_time:.1f}s on {translation.device}")
+
+    rows = []
+    for batch_size in [int(x) for x in args.batch_sizes.split(",")]:
+        if batch_size == 1:
+            # The old path: one tokenizer + generate() call per segment
+            _, elapsed = _timed(lambda: [translator.translate(t, target_lang=args.target) for t in texts])
+        else:
+            _, elapsed = _timed(translator.translate_batch, texts, target_lang=args.target,
+                                max_tokens=args.max_tokens, max_batch=batch_size)
+        rows.append([batch_size, f"{elapsed:.1f}s", f"{len(texts) / elapsed:.2f}"])
+
+    _print_table(["batch", "wall", "segments/s"], rows)
+
+def bench_nllb_engines(args):
+    """Latency, memory and BLEU/chrF of the quantized NLLB engines against fp32 output."""
+    import gc
+    import model_manager
+    import translation
+
+    texts = _read_lines(args.fixture, args.limit)
+    references = _read_lines(args.references) if args.references else None
+
+    rows = []
+    baseline = None
+    for engine in args.engines.split(","):
+        rss_before = model_manager._rss_bytes()
+        translator, load_time = _timed(translation.NLLBTranslator, engine, args.model_dir)
+        rss = (model_manager._rss_bytes() - rss_before) / 1024 / 1024
+
+        outputs, elapsed = _timed(translator.translate_batch, texts, target_lang=args.target,
+                                  max_batch=args.batch_size)
+        if baseline is None: baseline = outputs  # first engine (fp32 torch) is the reference
+
+        row = [engine, f"{load_time:.1f}s", f"{rss:.0f} MB", f"{elapsed / len(texts) * 1000:.0f} ms",
+               f"{corpus_bleu(baseline, outputs):.1f}", f"{corpus_chrf(baseline, outputs):.1f}"]
+        if references:
+            row += [f"{corpus_bleu(references, outputs):.1f}", f"{corpus_chrf(references, outputs):.1f}"]
+        rows.append(row)
+
+        translator.unload()
+        del translator
+        gc.collect()
+
+    headers = ["engine", "load", "RSS", "latency/seg", "BLEU vs fp32", "chrF vs fp32"]
+    if references: headers += ["BLEU vs ref", "chrF vs ref"]
+    _print_table(headers, rows)
+
+def _legacy_mask_text(text, terms):
+    """translation.mask_text before the compiled TermMasker (one regex per term per segment)."""
+    mask_map = {}
+    masked_text = text
+    for i, term in enumerate(sorted(terms, key=len, reverse=True)):
+        pattern = re.compile(r'\b' + re.escape(term) + r'\b', re.IGNORECASE)
+        if pattern.search(masked_text):
+            placeholder = f"__ID_{i}__"
+            masked_text = pattern.sub(placeholder, masked_text)
+            mask_map[placeholder] = term
+    return masked_text, mask_map
+
+def _legacy_unmask_text(text, mask_map):
+    for placeholder, term in mask_map.items():
+        text = text.replace(placeholder, term)
+        text = text.replace(placeholder.replace("_", " "), term)
+    return text
+
+def bench_masking(args):
+    """Hinglish term protection: compiled single-pass masker vs. the old per-term regex loop."""
+    import random
+    import string
+    import translation
+
+    rng = random.Random(0)
+    word = lambda: "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+    terms = list(dict.fromkeys(word().capitalize() for _ in range(args.terms)))
+    vocab = [word() for _ in range(2000)] + terms
+    segments = [" ".join(rng.choice(vocab) for _ in range(rng.randint(6, 20))) for _ in range(args.segments)]
+
+    def run(mask, unmask):
+        out = []
+        for text in segments:
+            masked, mask_map = mask(text, terms)
+            out.append(unmask(masked, mask_map))
+        return out
+
+    legacy, t_legacy = _timed(run, _legacy_mask_text, _legacy_unmask_text)
+    new, t_new = _timed(run, translation.mask_text, translation.unmask_text)
+    same = sum(a == b for a, b in zip(legacy, new))
+
+    _print_table(["impl", "wall", "segments/s"], [
+        ["per-term regex", f"{t_legacy:.2f}s", f"{len(segments) / t_legacy:.0f}"],
+        ["TermMasker", f"{t_new:.2f}s", f"{len(segments) / t_new:.0f}"],
+    ])
+    print(f"   > {len(terms)} terms x {len(segments)} segments, speedup {t_legacy / t_new:.1f}x, "
+          f"identical output {same}/{len(segments)}")
+
+class _SyntheticTTS:
+    """Stands in for XTTS in the dub benchmark: sleeps like inference, returns a deterministic voice-like clip."""
+    def __init__(self, latency, sample_rate=24000):
+        import numpy as np
+        self.np = np
+        self.latency = latency
+        self.synthesizer = type("Synth", (), {"output_sample_rate": sample_rate})()
+
+    def tts(self, text, speaker_wav=None, language=None):
+        np = self.np
+        time.sleep(self.latency)
+        sr = self.synthesizer.output_sample_rate
+        rng = np.random.default_rng(sum(map(ord, text)))
+        # Words separated by pauses, ~30% longer than the slot so squeeze + stretch both run
+        out = []
+        for _ in range(len(text.split())):
+            n = int(sr * rng.uniform(0.2, 0.4))
+            t = np.arange(n) / sr
+            out.append(0.3 * np.sin(2 * np.pi * rng.uniform(100, 250) * t) * np.hanning(n))
+            out.append(np.zeros(int(sr * rng.uniform(0.05, 0.4))))
+        return np.concatenate(out).astype(np.float32)
+
+def bench_dub_pipeline(args):
+    """Sequential vs. overlapped dubbing on a synthetic fixture (hundreds of segments)."""
+    import os
+    import shutil
+    import tempfile
+    import numpy as np
+    import dubbing
+    from audio_source import AudioSource, read_wav, write_wav
+
+    rng = np.random.default_rng(0)
+    segments, t = [], 0.5
+    for k in range(args.segments):
+        dur = rng.uniform(1.0, 3.0)
+        words = max(int(dur * 2.5), 1)
+        segments.append({'start': t, 'end': t + dur, 'text': " ".join(f"w{k}_{j}" for j in range(words)),
+                         'voice_label': 'Male'})
+        t += dur + rng.uniform(0.1, 0.8)
+
+    scratch = tempfile.mkdtemp(prefix="reflow_bench_")
+    try:
+        # Fixture audio: quiet noise for the reference clips
+        fixture = os.path.join(scratch, "fixture.wav")
+        write_wav(fixture, (rng.standard_normal(int((t + 1) * 24000)) * 0.05).astype(np.float32), 24000)
+        tts = _SyntheticTTS(args.tts_ms / 1000.0)
+        rows, tracks = [], {}
+        with AudioSource(fixture) as source:
+            for pipeline in args.pipelines.split(","):
+                out = os.path.join(scratch, f"dub_{pipeline}.wav")
+                segs = [dict(s) for s in segments]
+                _, elapsed = _timed(dubbing.generate_dub_audio, segs, out, fixture, tts, mode="english",
+                                    audio_source=source, speaker_cache=False, pipeline=pipeline,
+                                    post_workers=args.post_workers)
+                tracks[pipeline] = read_wav(out)[0]
+                rows.append([pipeline, f"{elapsed:.1f}s", f"{len(segments) / elapsed:.1f}"])
+
+        _print_table(["pipeline", "wall", "segments/s"], rows)
+        names = list(tracks)
+        for name in names[1:]:
+            same = np.array_equal(tracks[names[0]], tracks[name])
+            print(f"   > {name} vs {names[0]}: {'identical' if same else 'DIFFERENT'} output")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+def bench_visual_scan(args):
+    """NSFW scan throughput vs. classifier batch size (detections must not change)."""
+    import visual_censor
+
+    visual_censor.get_classifier()  # load once, outside the timings
+    rows, baseline = [], None
+    for decoder in args.decoders.split(","):
+        for batch_size in [int(x) for x in args.batch_sizes.split(",")]:
+            intervals, elapsed = _timed(visual_censor.scan_video_for_content, args.video,
+                                        batch_size=batch_size, decoder=decoder)
+            if baseline is None: baseline = intervals
+            rows.append([decoder, batch_size, len(intervals), f"{elapsed:.1f}s",
+                         "yes" if intervals == baseline else "NO"])
+    _print_table(["decoder", "batch", "intervals", "wall", "same as first"], rows)
+
+def bench_frame_decode(args):
+    """Decode-only cost of the scan's frame sampling (no classifier)."""
+    import frame_source
+
+    rows = []
+    for decoder in args.decoders.split(","):
+        frames, elapsed = _timed(lambda: sum(1 for _ in frame_source.iter_sampled_frames(args.video, decoder=decoder)))
+        rows.append([decoder, frames, f"{elapsed:.1f}s", f"{frames / elapsed:.0f}"])
+    _print_table(["decoder", "sampled frames", "wall", "frames/s"], rows)
+
+def _covered_seconds(intervals, reference):
+    """Seconds of `reference` intervals that are also inside `intervals`."""
+    total = 0.0
+    for a, b in reference:
+        for x, y in intervals:
+            total += max(0.0, min(b, y) - max(a, x))
+    return total
+
+def bench_scan_recall(args):
+    """Adaptive vs. fixed-interval visual scan: recall of the fixed scan's detections and throughput."""
+    import visual_censor
+
+    classifier = visual_censor.get_classifier()  # load once, outside the timings
+    (fixed_pairs, _), t_fixed = _timed(visual_censor._scan_fixed, classifier, args.video,
+                                       batch_size=args.batch_size, decoder=args.decoder)
+    (adaptive_pairs, _), t_adaptive = _timed(visual_censor._scan_adaptive, classifier, args.video,
+                                             batch_size=args.batch_size, decoder=args.decoder)
+    fixed_raw = visual_censor.detections(fixed_pairs)
+    adaptive_raw = visual_censor.detections(adaptive_pairs)
+    fixed = visual_censor.merge_timestamps_with_gap_filling(list(fixed_raw))
+    adaptive = visual_censor.merge_timestamps_with_gap_filling(list(adaptive_raw))
+
+    # Frame recall: fixed-scan detections that end up inside an adaptive blur interval
+    caught = sum(1 for t in fixed_raw if any(a <= t <= b for a, b in adaptive))
+    frame_recall = caught / len(fixed_raw) if fixed_raw else 1.0
+    fixed_sec = sum(b - a for a, b in fixed)
+    time_recall = _covered_seconds(adaptive, fixed) / fixed_sec if fixed_sec else 1.0
+    extra = sum(b - a for a, b in adaptive) - _covered_seconds(fixed, adaptive)
+
+    _print_table(["scan", "detections", "intervals", "wall", "speedup"], [
+        ["fixed", len(fixed_raw), len(fixed), f"{t_fixed:.1f}s", "1.00x"],
+        ["adaptive", len(adaptive_raw), len(adaptive), f"{t_adaptive:.1f}s", f"{t_fixed / t_adaptive:.2f}x"],
+    ])
+    print(f"   > Recall vs fixed: {frame_recall * 100:.1f}% of detections, {time_recall * 100:.1f}% of blurred time; "
+          f"{extra:.1f}s blurred only by the adaptive scan")
+
+def bench_scan_scaling(args):
+    """Parallel (sharded) visual scan vs. decoder process count; detections must match the fixed scan."""
+    import visual_censor
+
+    classifier = visual_censor.get_classifier()  # load once, outside the timings
+    (pairs, _), t_base = _timed(visual_censor._scan_fixed, classifier, args.video,
+                                batch_size=args.batch_size, decoder=args.decoder)
+    baseline = visual_censor.detections(pairs)
+    rows = [["fixed", "-", len(baseline), f"{t_base:.1f}s", "1.00x", "-"]]
+    for workers in [int(x) for x in args.workers.split(",")]:
+        (pairs, _), elapsed = _timed(visual_censor._scan_parallel, classifier, args.video,
+                                     batch_size=args.batch_size, decoder=args.decoder, workers=workers,
+                                     consumers=args.consumers)
+        raw = visual_censor.detections(pairs)
+        rows.append(["parallel", workers, len(raw), f"{elapsed:.1f}s", f"{t_base / elapsed:.2f}x",
+                     "yes" if raw == baseline else "NO"])
+    _print_table(["scan", "workers", "detections", "wall", "speedup", "same detections"], rows)
+
+def bench_blur_render(args):
+    """Full vs. smart (GOP-only) blur render for a given set of blur intervals."""
+    import os
+    import tempfile
+    import visual_censor
+    import smart_render
+
+    intervals = [[float(x) for x in span.split("-")] for span in args.intervals.split(",")]
+    duration = (smart_render.probe_video(args.video) or {}).get("duration", 0.0)
+    with tempfile.TemporaryDirectory(prefix="reflow_bench_") as tmp:
+        rows = []
+        for name, smart in [("full", False), ("smart", True)]:
+            out = os.path.join(tmp, f"{name}.mp4")
+            _, elapsed = _timed(visual_censor.apply_blur_to_video, args.video, out, intervals,
+                                smart=smart, scratch_dir=tmp)
+            size = os.path.getsize(out) / 1e6 if os.path.exists(out) else 0.0
+            rows.append([name, f"{elapsed:.1f}s", f"{duration / elapsed:.1f}x" if elapsed else "-", f"{size:.1f} MB"])
+    _print_table(["render", "wall", "x realtime", "output"], rows)
+
+def bench_stage_dag(args):
+    """Sequential vs. DAG scheduling of one job's stage graph, with simulated stage costs (seconds)."""
+    import streaming
+    from scheduler import Scheduler, Stage
+
+    cost = {k: float(v) * args.scale for k, v in (item.split("=") for item in args.costs.split(","))}
+    n_segments = 50
+
+    def sleeper(name, out):
+        def fn(values, publish):
+            time.sleep(cost.get(name, 0.0))
+            return {out: name}
+        return fn
+
+    def speech(values, publish):
+        live = streaming.Channel()
+        publish("speech_stream", live)
+        for k in range(n_segments):
+            time.sleep(cost["speech"] / n_segments)
+            live.put(k)
+        live.close()
+        return {"segments": list(range(n_segments))}
+
+    def dub(values, publish):
+        for _ in values["speech_stream"]: time.sleep(cost["dub"] / n_segments)
+        return {"dub_track": "dub"}
+
+    stages = [
+        Stage("audio", sleeper("audio", "audio"), outputs=["audio"], resource="cpu"),
+        Stage("speech", speech, inputs=["audio"], outputs=["speech_stream", "segments"], resource="model"),
+        Stage("dub", dub, inputs=["speech_stream"], outputs=["dub_track"], resource="model"),
+        Stage("subtitles", sleeper("subtitles", "srt"), inputs=["segments"], outputs=["srt"], resource="cpu"),
+        Stage("scan", sleeper("scan", "blur_intervals"), outputs=["blur_intervals"], resource="model"),
+        Stage("blur", sleeper("blur", "video"), inputs=["blur_intervals"], outputs=["video"], resource="ffmpeg"),
+        Stage("merge", sleeper("merge", "output"), inputs=["dub_track", "srt", "video"], outputs=["output"],
+              resource="ffmpeg"),
+    ]
+    walls = {}
+    for name, parallel in [("sequential", False), ("dag", True)]:
+        _, walls[name] = _timed(Scheduler({"model": args.model_slots}, parallel=parallel).run, stages)
+    _print_table(["scheduler", "wall", "saved"], [
+        ["sequential", f"{walls['sequential']:.2f}s", "-"],
+        ["dag", f"{walls['dag']:.2f}s", f"{(1 - walls['dag'] / walls['sequential']) * 100:.0f}%"],
+    ])
+
+def main():
+    parser = argparse.ArgumentParser(description="ReFlow performance benchmarks")
+    sub = parser.add_subparsers(dest="suite", required=True)
+
+    p = sub.add_parser("transcribe", help="chunked transcription throughput vs. workers")
+    p.add_argument("video")
+    p.add_argument("--model", default="base")
+    p.add_argument("--backend", default="whisper")
+    p.add_argument("--compute-type", default="auto")
+    p.add_argument("--workers", default="1,2,4,8")
+    p.add_argument("--chunk-sec", type=float, default=60.0)
+    p.set_defaults(func=bench_transcribe)
+
+    p = sub.add_parser("asr", help="speed vs. WER of transcription backends")
+    p.add_argument("fixture", help="audio or video file")
+    p.add_argument("reference", help="reference transcript (.txt)")
+    p.add_argument("--configs", default="whisper:base:float32,whisper-int8:base,whisper:small:float32,whisper-int8:small")
+    p.add_argument("--device", default="cpu")
+    p.set_defaults(func=bench_asr)
+
+    p = sub.add_parser("translate", help="NLLB throughput vs. batch size")
+    p.add_argument("fixture", help="text file, one segment per line")
+    p.add_argument("--batch-sizes", default="1,4,8,16,32,64")
+    p.add_argument("--max-tokens", type=int, default=1 << 30, help="padded-token budget per batch")
+    p.add_argument("--target", default="hindi")
+    p.add_argument("--limit", type=int, default=None)
+    p.set_defaults(func=bench_translate)
+
+    p = sub.add_parser("nllb-engines", help="latency/memory/quality of torch vs int8 vs onnx NLLB")
+    p.add_argument("fixture", help="text file, one source segment per line")
+    p.add_argument("--references", help="optional reference translations, one per line")
+    p.add_argument("--engines", default="torch,int8,onnx", help="first engine is the quality baseline")
+    p.add_argument("--model-dir", default="models")
+    p.add_argument("--target", default="hindi")
+    p.add_argument("--batch-size", type=int, default=16)
+    p.add_argument("--limit", type=int, default=None)
+    p.set_defaults(func=bench_nllb_engines)
+
+    p = sub.add_parser("masking", help="Hinglish term masking, old vs. compiled")
+    p.add_argument("--terms", type=int, default=1000)
+    p.add_argument("--segments", type=int, default=5000)
+    p.set_defaults(func=bench_masking)
+
+    p = sub.add_parser("dub-pipeline", help="sequential vs. overlapped TTS + clip post-processing")
+    p.add_argument("--segments", type=int, default=300)
+    p.add_argument("--tts-ms", type=float, default=150.0, help="simulated TTS latency per segment")
+    p.add_argument("--post-workers", type=int, default=2)
+    p.add_argument("--pipelines", default="sequential,overlapped")
+    p.set_defaults(func=bench_dub_pipeline)
+
+    p = sub.add_parser("visual-scan", help="NSFW scan throughput vs. classifier batch size")
+    p.add_argument("video")
+    p.add_argument("--batch-sizes", default="1,8,16,32")
+    p.add_argument("--decoders", default="ffmpeg,opencv")
+    p.set_defaults(func=bench_visual_scan)
+
+    p = sub.add_parser("frame-decode", help="decode-only cost of the visual scan's frame sampling")
+    p.add_argument("video")
+    p.add_argument("--decoders", default="ffmpeg,opencv")
+    p.set_defaults(func=bench_frame_decode)
+
+    p = sub.add_parser("scan-recall", help="adaptive vs. fixed visual scan: recall and throughput")
+    p.add_argument("video")
+    p.add_argument("--batch-size", type=int, default=16)
+    p.add_argument("--decoder", default="ffmpeg")
+    p.set_defaults(func=bench_scan_recall)
+
+    p = sub.add_parser("scan-scaling", help="parallel visual scan speedup vs. decoder processes")
+    p.add_argument("video")
+    p.add_argument("--workers", default="1,2,4,8")
+    p.add_argument("--consumers", type=int, default=1)
+    p.add_argument("--batch-size", type=int, default=16)
+    p.add_argument("--decoder", default="ffmpeg")
+    p.set_defaults(func=bench_scan_scaling)
+
+    p = sub.add_parser("blur-render", help="full re-encode vs. smart render of blurred GOPs")
+    p.add_argument("video")
+    p.add_argument("--intervals", default="60-70,300-310", help="blur intervals as start-end,start-end (seconds)")
+    p.set_defaults(func=bench_blur_render)
+
+    p = sub.add_parser("stage-dag", help="sequential vs. DAG stage scheduling (simulated stage costs)")
+    p.add_argument("--costs", default="audio=5,speech=120,dub=90,subtitles=1,scan=60,blur=10,merge=8",
+                   help="stage=seconds for a typical job with blur enabled")
+    p.add_argument("--scale", type=float, default=0.01, help="multiplier applied to the costs")
+    p.add_argument("--model-slots", type=int, default=2)
+    p.set_defaults(func=bench_stage_dag)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
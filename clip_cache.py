@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import numpy as np
+
+# Persistent TTS clip cache, one folder per job (= source audio + dub mode).
+# A clip is stored already fitted to its slot, so re-rendering a job only runs
+# XTTS for segments whose text, speaker reference or slot duration changed.
+
+DEFAULT_MAX_MB = 2048
+CACHE_VERSION = 1
+
+def cache_dir_for(model_dir):
+    return os.path.join(model_dir, "cache", "dub_clips")
+
+def job_id(audio_hash, mode):
+    return hashlib.sha256(f"{audio_hash}:{mode}".encode("utf-8")).hexdigest()[:24]
+
+def make_key(text, language, ref_hash, slot_duration, model_id):
+    """Key = exact text + target language + speaker reference + slot (ms) + TTS model."""
+    raw = json.dumps([CACHE_VERSION, text, language, ref_hash, round(slot_duration, 3), model_id])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ClipCache:
+    def __init__(self, cache_dir, job, max_mb=DEFAULT_MAX_MB):
+        self.root = cache_dir
+        self.job = job
+        self.job_dir = os.path.join(cache_dir, job)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.job_dir, exist_ok=True)
+        os.utime(self.job_dir, None)  # LRU is per job: last use = mtime of the job folder
+
+    def _path(self, key):
+        return os.path.join(self.job_dir, f"{key}.npy")
+
+    def get(self, key):
+        """The fitted clip (float32 @ TTS rate), or None."""
+        try:
+            clip = np.load(self._path(key), allow_pickle=False)
+        except (OSError, ValueError):
+            with self._lock: self.misses += 1
+            return None
+        with self._lock: self.hits += 1
+        return clip
+
+    def put(self, key, clip):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.save(f, np.asarray(clip, dtype=np.float32), allow_pickle=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"   > Clip cache write failed: {e}")
+            if os.path.exists(tmp): os.remove(tmp)
+
+    # --- Manifest of the last render (what redub compares against) ---
+    def _manifest_path(self):
+        return os.path.join(self.job_dir, "segments.json")
+
+    def save_manifest(self, segments):
+        keep = ('start', 'end', 'text', 'voice_label')
+        with open(self._manifest_path(), "w", encoding="utf-8") as f:
+            json.dump([{k: s[k] for k in keep if k in s} for s in segments], f, ensure_ascii=False)
+
+    def load_manifest(self):
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # --- Last rendered dub track (what redub splices edited lines into) ---
+    def _track_path(self):
+        return os.path.join(self.job_dir, "dub_track.wav")
+
+    def save_track(self, dub_path):
+        """Keeps a copy of the job's dub track; the manifest is its segment list."""
+        path = self._track_path()
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(dub_path, tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"   > Dub track cache write failed: {e}")
+            # A stale track next to a newer manifest would splice into the wrong audio
+            for p in (tmp, path):
+                if os.path.exists(p): os.remove(p)
+
+    def load_track(self):
+        """(track path, segments of that render) from the last render of this job, or None."""
+        path, segments = self._track_path(), self.load_manifest()
+        if segments is None or not os.path.exists(path): return None
+        return path, segments
+
+    # --- Size limit ---
+    def evict(self):
+        """Drops least-recently-used jobs (never the current one) until the cache fits max_bytes."""
+        jobs = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path): continue
+            size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+            jobs.append((path, size, os.stat(path).st_mtime))
+        total = sum(size for _, size, _ in jobs)
+        for path, size, _ in sorted(jobs, key=lambda x: x[2]):
+            if total <= self.max_bytes: break
+            if path == self.job_dir: continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def stats(self):
+        files = [e for e in os.scandir(self.job_dir) if e.name.endswith(".npy")]
+        return {
+            "clips": len(files),
+            "bytes": sum(e.stat().st_size for e in files),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def clear(self):
+        shutil.rmtree(self.job_dir, ignore_errors=True)
+        os.makedirs(self.job_dir, exist_ok=True)
@@ -3,8 +3,13 @@ import os
 import subprocess
 import shutil
 import gc
-from pydub import AudioSegment
-from pydub.silence import split_on_silence
+import hashlib
+import tempfile
+import numpy as np
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from audio_source import resample, read_wav, write_wav
+from audio_dsp import remove_silence, time_stretch
 
 # --- PYTORCH 2.6 PATCH ---
 try:
@@ -16,6 +21,14 @@ try:
 except Exception: pass
 # -------------------------
 
+XTTS_MODEL_ID = "tts_models/multilingual/multi-dataset/xtts_v2"
+
+def load_tts_model():
+    """Loader for the Model Manager ('xtts')."""
+    from TTS.api import TTS
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return TTS(XTTS_MODEL_ID).to(device)
+
 def get_duration(filename):
     try:
         cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", 
@@ -23,108 +36,414 @@ def get_duration(filename):
         return float(subprocess.check_output(cmd).strip())
     except: return 0.0
 
-def smart_squeeze_audio(file_path, target_duration):
-    try:
-        audio = AudioSegment.from_wav(file_path)
-    except: return 1.0, False 
+# --- In-Memory Clip Processing ---
+TTS_SAMPLE_RATE = 24000      # XTTS output rate, also the timeline rate
+OUTPUT_SAMPLE_RATE = 44100   # Final dub track: 44.1 kHz stereo (as before)
+MIN_SLOT = 0.5               # Minimum slot per segment (seconds)
+MAX_SPEED = 1.3              # Anything higher than 1.3 sounds broken
 
-    current_dur = len(audio) / 1000.0
-    
-    # 1. Silence Removal
+def smart_squeeze(samples, sample_rate, target_duration):
+    """
+    In-memory version of the squeeze rules. Returns (samples, speed, needs_trim).
+    samples: float32 mono (-1..1).
+    """
+    current_dur = len(samples) / float(sample_rate)
+
+    # 1. Silence Removal (300ms below -40 dBFS, same rule as before)
     if current_dur > target_duration:
-        chunks = split_on_silence(audio, min_silence_len=300, silence_thresh=-40)
-        if chunks:
-            no_silence = chunks[0]
-            for c in chunks[1:]: no_silence += c
-            no_silence.export(file_path, format="wav")
-            current_dur = len(no_silence) / 1000.0
+        samples = remove_silence(samples, sample_rate, min_silence_len=0.3, silence_thresh=-40)
+        current_dur = len(samples) / float(sample_rate)
 
     # 2. Gentle Speed Calculation
     if current_dur > target_duration:
         speed = current_dur / target_duration
         
         # LOWER CAP: 1.3x max (was 1.5x)
-        # Anything higher than 1.3 sounds broken.
-        final_speed = min(speed, 1.3)
+        final_speed = min(speed, MAX_SPEED)
         
         # If 1.3x isn't enough, we trim.
-        return final_speed, True 
+        return samples, final_speed, True 
         
-    return 1.0, False
+    return samples, 1.0, False
+
+def smart_squeeze_audio(file_path, target_duration):
+    """File-based wrapper kept for callers outside the dub engine. Returns (speed, needs_trim)."""
+    try:
+        data, sr = read_wav(file_path)
+    except: return 1.0, False
+    samples = data.astype(np.float32).mean(axis=1) / 32768.0
+    squeezed, speed, needs_trim = smart_squeeze(samples, sr, target_duration)
+    if len(squeezed) != len(samples): write_wav(file_path, squeezed, sr)
+    return speed, needs_trim
+
+def atempo(samples, sample_rate, speed):
+    """Pitch-preserving speed change (in-process WSOLA, no ffmpeg spawn)."""
+    return time_stretch(samples, speed, sample_rate)
+
+def synthesize(tts, text, ref_audio, language):
+    """TTS straight to a float32 array at TTS_SAMPLE_RATE (no raw_{i}.wav)."""
+    wav = tts.tts(text=text, speaker_wav=ref_audio, language=language)
+    sr = getattr(getattr(tts, "synthesizer", None), "output_sample_rate", TTS_SAMPLE_RATE)
+    return resample(np.asarray(wav, dtype=np.float32), sr, TTS_SAMPLE_RATE)
+
+def fit_to_slot(samples, slot_duration, sample_rate=TTS_SAMPLE_RATE):
+    """STRICT SYNC: squeeze, speed up (max 1.3x) and hard-cut at the slot if still too long."""
+    samples, speed, needs_trim = smart_squeeze(samples, sample_rate, slot_duration)
+    samples = atempo(samples, sample_rate, speed)
+    if needs_trim:
+        samples = samples[:int(round(slot_duration * sample_rate))]
+    return samples
+
+class DubTimeline:
+    """
+    Preallocated mono sample buffer for the whole dub track. Clips are written at
+    their exact start offset; gaps cost nothing. Grows if a clip lands past the end.
+    """
+    def __init__(self, duration=0.0, sample_rate=TTS_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.buffer = np.zeros(int(duration * sample_rate) + 1, dtype=np.float32)
+        self.length = 0  # end of the last written slot (samples)
+
+    def _ensure(self, n):
+        if n > len(self.buffer):
+            grown = np.zeros(max(n, len(self.buffer) * 2), dtype=np.float32)
+            grown[:len(self.buffer)] = self.buffer
+            self.buffer = grown
+
+    def write(self, start, clip, slot_end=None):
+        """Places clip at `start` seconds. A later clip overwrites the tail of an earlier one."""
+        a = int(round(start * self.sample_rate))
+        b = a + len(clip)
+        self._ensure(b)
+        self.buffer[a:b] = clip
+        end = b if slot_end is None else max(b, int(round(slot_end * self.sample_rate)))
+        self.length = max(self.length, end)
 
-# ... inside generate_dub_audio function ...
-# When building the ffmpeg command, add the bitrate:
+    def export(self, output_file, sample_rate=OUTPUT_SAMPLE_RATE, channels=2):
+        track = resample(self.buffer[:self.length], self.sample_rate, sample_rate)
+        if channels > 1:
+            track = np.repeat(np.asarray(track, dtype=np.float32)[:, None], channels, axis=1).reshape(-1)
+        write_wav(output_file, track, sample_rate, channels=channels)
+        return output_file
 
-def extract_reference_audio(video_path, start, dur, out_path):
+def extract_reference_audio(video_path, start, dur, out_path, audio_source=None):
+    if audio_source is not None and len(audio_source.samples) > 0:
+        # Slice the shared decoded buffer (no ffmpeg spawn per segment)
+        audio_source.write_clip(start, dur, out_path)
+        return
     subprocess.run(f'ffmpeg -y -v error -ss {start} -i "{video_path}" -t {dur} -vn -acodec pcm_s16le -ar 24000 "{out_path}"', shell=True)
 
-def generate_dub_audio(segments, output_file, video_source_path, tts_model, mode="hindi"):
-    print(f"--- XTTS ENGINE ({mode.upper()}) ---")
-    tts = tts_model
-    
-    if os.path.exists("temp_chunks"): shutil.rmtree("temp_chunks")
-    os.makedirs("temp_chunks")
-    
-    # --- PRE-PROCESS: Fix Overlapping Timestamps ---
-    # Ensure Segment A ends before Segment B starts
-    for i in range(len(segments) - 1):
-        if segments[i]['end'] > segments[i+1]['start']:
-            segments[i]['end'] = segments[i+1]['start']
-    # -----------------------------------------------
-
-    final_concat_list = "temp_chunks/final_list.txt"
-    
-    for i, seg in enumerate(segments):
-        text = seg['text']
-        # Enforce Minimum Duration (0.5s) to prevent FFmpeg errors
-        start = seg['start']
-        end = max(seg['end'], start + 0.5) 
-        slot_duration = end - start
-        
-        ref_audio = f"temp_chunks/ref_{i}.wav"
-        extract_reference_audio(video_source_path, start, slot_duration, ref_audio)
-        
-        raw_file = f"temp_chunks/raw_{i}.wav"
+def iter_clamped(segments):
+    """
+    Fix Overlapping Timestamps: ensure Segment A ends before Segment B starts.
+    Works on any iterable with one segment of lookahead, so a stream can be dubbed
+    while it is still being produced. Segments are clamped in place (as before).
+    """
+    prev = None
+    for seg in segments:
+        if prev is not None:
+            if prev['end'] > seg['start']:
+                prev['end'] = seg['start']
+            yield prev
+        prev = seg
+    if prev is not None:
+        yield prev
+
+DUB_PIPELINES = ("overlapped", "sequential")
+POST_WORKERS = 2     # Threads that squeeze/stretch finished clips
+MAX_PENDING = 8      # Clips waiting for post-processing (caps memory)
+
+def slot_of(seg):
+    """Slot duration of a (clamped) segment. Enforces the minimum duration (0.5s)."""
+    start = seg['start']
+    end = max(seg['end'], start + MIN_SLOT)
+    return end - start
+
+class ClipRenderer:
+    """
+    One segment -> one clip fitted to its slot: clip cache, else TTS + squeeze/stretch.
+    Shared by the full dub and the incremental re-dub so both produce the same clips.
+    tts_loader: called on the first cache miss when no tts model is given
+                (a re-dub that only hits the cache never loads XTTS).
+    """
+    def __init__(self, mode, video_source_path, audio_source=None, tts=None, tts_loader=None,
+                 speaker_cache=True, clip_cache=None, scratch_dir=None):
+        self.language = "hi" if mode in ["hindi", "hinglish"] else "en"
+        self.video_source_path = video_source_path
+        self.audio_source = audio_source
+        self.clip_cache = clip_cache
+        self._tts = tts
+        self._tts_loader = tts_loader
+        self.use_speakers = speaker_cache and audio_source is not None and len(audio_source.samples) > 0
+        self.windows = {}       # voice_label -> reference windows (shared with SpeakerCache)
+        self._ref_hashes = {}
+        self._used_refs = {}    # id(seg) -> reference the last synthesis of seg cloned from
+        self.speakers = None
+        self._speakers_ready = False
+        self.scratch = tempfile.mkdtemp(prefix="reflow_ref_", dir=scratch_dir)
+        self._cache_base = (clip_cache.hits, clip_cache.misses) if clip_cache is not None else (0, 0)
+
+    @property
+    def tts(self):
+        if self._tts is None and self._tts_loader is not None:
+            self._tts = self._tts_loader()
+        return self._tts
+
+    def _speaker_cache(self):
+        if not self._speakers_ready:
+            self._speakers_ready = True
+            if self.use_speakers:
+                from speaker_cache import SpeakerCache
+                self.speakers = SpeakerCache(self.tts, self.audio_source, scratch_dir=self.scratch,
+                                             windows=self.windows)
+                if not self.speakers.supported:
+                    self.speakers.close()
+                    self.speakers = None
+        return self.speakers
+
+    # --- Cache ---
+    def ref_hash(self, seg):
+        """
+        Identity of the voice reference this segment is (or would be) cloned from: the
+        speaker latents while speaker mode is live, else its own reference slice. Once
+        the speaker cache turned out unsupported or fell back, per-segment keys are used.
+        """
+        if self.use_speakers and not (self._speakers_ready and self.speakers is None):
+            return self._speaker_ref_hash(seg)
+        return self._segment_ref_hash(seg)
+
+    def _speaker_ref_hash(self, seg):
+        from speaker_cache import speaker_windows, reference_hash
+        label = seg.get('voice_label') or "default"
+        if label not in self._ref_hashes:
+            if label not in self.windows:
+                self.windows[label] = speaker_windows(self.audio_source, seg)
+            self._ref_hashes[label] = "spk:" + reference_hash(self.audio_source, self.windows[label])
+        return self._ref_hashes[label]
+
+    def _segment_ref_hash(self, seg):
+        if self.audio_source is not None and len(self.audio_source.samples) > 0:
+            ref = self.audio_source.slice(seg['start'], slot_of(seg))
+            return "seg:" + hashlib.sha1(np.ascontiguousarray(ref).tobytes()).hexdigest()
+        return f"file:{self.video_source_path}:{seg['start']:.3f}:{slot_of(seg):.3f}"
+
+    def key(self, seg, ref=None):
+        import clip_cache
+        return clip_cache.make_key(seg['text'], self.language, ref or self.ref_hash(seg), slot_of(seg), XTTS_MODEL_ID)
+
+    def cached(self, seg):
+        if self.clip_cache is None: return None
+        return self.clip_cache.get(self.key(seg))
+
+    # --- Render ---
+    def synthesize(self, i, seg):
+        """Raw TTS output for one segment (float32 @ TTS_SAMPLE_RATE, empty on failure)."""
+        speakers = self._speaker_cache()
+        if speakers is not None:
+            try:
+                speakers.latents_for(seg)
+            except Exception as e:
+                print(f"   > Speaker cache failed ({e}), using per-segment references")
+                speakers.close()
+                self.speakers = speakers = None
+
+        if speakers is not None:
+            try:
+                clip = speakers.synthesize(seg['text'], self.language, seg)
+                self._used_refs[id(seg)] = self._speaker_ref_hash(seg)
+                return resample(clip, speakers.output_sample_rate, TTS_SAMPLE_RATE)
+            except Exception as e:
+                print(f"   > TTS Error (segment {i}): {e}")
+                return np.zeros(0, dtype=np.float32)
+
+        ref_audio = os.path.join(self.scratch, f"ref_{i}.wav")
+        extract_reference_audio(self.video_source_path, seg['start'], slot_of(seg), ref_audio,
+                                audio_source=self.audio_source)
         try:
-            target_lang = "hi" if mode in ["hindi", "hinglish"] else "en"
-            tts.tts_to_file(text=text, speaker_wav=ref_audio, language=target_lang, file_path=raw_file)
-        except:
-            # Generate silence if TTS fails
-            subprocess.run(f'ffmpeg -y -v error -f lavfi -i anullsrc=r=24000:cl=mono -t {slot_duration} "{raw_file}"', shell=True)
-
-        # STRICT SYNC
-        final_file = f"temp_chunks/final_{i}.wav"
-        
-        # Calculate Speed & Trim
-        speed, needs_trim = smart_squeeze_audio(raw_file, slot_duration)
-        
-        cmd = f'ffmpeg -y -v error -i "{raw_file}" -filter:a "atempo={speed}" -ar 24000 '
-        if needs_trim:
-            # HARD CUT at exact slot duration
-            cmd += f'-t {slot_duration} '
-        cmd += f'"{final_file}"'
-        
-        subprocess.run(cmd, shell=True)
-
-    # Master Merge
-    last_end = 0.0
-    with open(final_concat_list, "w", encoding="utf-8") as f:
-        for i, seg in enumerate(segments):
-            # Calculate Gap
-            gap = seg['start'] - last_end
-            
-            # If gap is positive, add silence
-            if gap > 0.01:
-                silence_f = f"temp_chunks/sil_gap_{i}.wav"
-                subprocess.run(f'ffmpeg -y -v error -f lavfi -i anullsrc=r=24000:cl=mono -t {gap} "{silence_f}"', shell=True)
-                f.write(f"file 'sil_gap_{i}.wav'\n")
-            
-            # If gap is negative (Overlap), we effectively skip the overlap by not adding silence
-            # The previous logic (clamping) prevents this, but this is a safety net.
-            
-            f.write(f"file 'final_{i}.wav'\n")
-            last_end = seg['end']
-
-    subprocess.run(f'ffmpeg -y -v error -f concat -safe 0 -i "{final_concat_list}" -ar 44100 -ac 2 "{output_file}"', shell=True)
-    if os.path.exists("temp_chunks"): shutil.rmtree("temp_chunks")
-    return output_file
\ No newline at end of file
+            clip = synthesize(self.tts, seg['text'], ref_audio, self.language)
+            self._used_refs[id(seg)] = self._segment_ref_hash(seg)
+            return clip
+        except Exception as e:
+            # Silence if TTS fails (the timeline is already silent there)
+            print(f"   > TTS Error (segment {i}): {e}")
+            return np.zeros(0, dtype=np.float32)
+        finally:
+            if os.path.exists(ref_audio): os.remove(ref_audio)
+
+    def finish(self, seg, clip):
+        """
+        Fits a raw clip to the slot and stores it under the reference synthesize() actually
+        cloned from. Thread-safe (runs in the post pool).
+        """
+        fitted = fit_to_slot(clip, slot_of(seg))
+        ref = self._used_refs.pop(id(seg), None)
+        if self.clip_cache is not None and len(clip) > 0 and ref is not None:
+            self.clip_cache.put(self.key(seg, ref), fitted)
+        return fitted
+
+    def render(self, i, seg):
+        clip = self.cached(seg)
+        if clip is None:
+            clip = self.finish(seg, self.synthesize(i, seg))
+        return clip
+
+    def close(self):
+        if self.speakers is not None:
+            self.speakers.report()
+            self.speakers.close()
+        if self.clip_cache is not None:
+            hits = self.clip_cache.hits - self._cache_base[0]
+            misses = self.clip_cache.misses - self._cache_base[1]
+            print(f"   > Clip cache: {hits} reused, {misses} synthesized")
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+def _done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+def generate_dub_audio(segments, output_file, video_source_path, tts_model, mode="hindi", audio_source=None,
+                       speaker_cache=True, pipeline="overlapped", post_workers=POST_WORKERS, max_pending=MAX_PENDING,
+                       clip_cache=None, scratch_dir=None):
+    """
+    segments: a list or any iterable of segments in time order (e.g. a translation stream).
+    The track is assembled in memory and written once at the end.
+    speaker_cache: compute XTTS speaker latents once per voice_label and reuse them
+                   (needs audio_source). False = per-segment reference clip, as before.
+    pipeline: "overlapped" = TTS runs the next segment while a thread pool fits finished
+              clips to their slots; "sequential" = one segment at a time.
+              Both write the clips in segment order, so the output is identical.
+    clip_cache: optional ClipCache. Cached clips skip TTS; the rendered segment list is
+                saved so redub_segments() can splice later edits into this track.
+    scratch_dir: where reference clips go (the job workspace). Default: system temp.
+    """
+    print(f"--- XTTS ENGINE ({mode.upper()}, {pipeline}) ---")
+    renderer = ClipRenderer(mode, video_source_path, audio_source, tts=tts_model,
+                            speaker_cache=speaker_cache, clip_cache=clip_cache, scratch_dir=scratch_dir)
+
+    duration = audio_source.duration if audio_source is not None else 0.0
+    timeline = DubTimeline(duration)
+    rendered = []
+
+    pool = None
+    pending = deque()  # (seg, future) in segment order
+    if pipeline == "overlapped":
+        pool = ThreadPoolExecutor(max_workers=max(post_workers, 1), thread_name_prefix="dub-post")
+
+    def write_oldest():
+        seg, future = pending.popleft()
+        timeline.write(seg['start'], future.result(), slot_end=seg['end'])
+
+    try:
+        for i, seg in enumerate(iter_clamped(segments)):
+            rendered.append(seg)
+            clip = renderer.cached(seg)
+
+            if pool is None:
+                if clip is None: clip = renderer.finish(seg, renderer.synthesize(i, seg))
+                timeline.write(seg['start'], clip, slot_end=seg['end'])
+                continue
+
+            # Hand the clip off and go straight back to TTS. Writes stay in segment order.
+            if clip is not None:
+                pending.append((seg, _done(clip)))
+            else:
+                pending.append((seg, pool.submit(renderer.finish, seg, renderer.synthesize(i, seg))))
+            while len(pending) > max_pending or (pending and pending[0][1].done()):
+                write_oldest()
+
+        while pending:
+            write_oldest()
+    finally:
+        if pool is not None: pool.shutdown(wait=True)
+        renderer.close()
+
+    if not rendered:
+        return output_file
+
+    # Master Write (single pass, no concat list)
+    timeline.export(output_file)
+    if clip_cache is not None:
+        clip_cache.save_manifest(rendered)
+        clip_cache.evict()
+    return output_file
+
+def _seg_id(seg):
+    return (round(seg['start'], 3), round(seg['end'], 3), seg['text'], seg.get('voice_label'))
+
+def _extent(seg):
+    return seg['start'], seg['start'] + slot_of(seg)
+
+def redub_segments(segments, dub_path, video_source_path, mode="hindi", audio_source=None, clip_cache=None,
+                   tts_model=None, tts_loader=None, old_segments=None, speaker_cache=True, scratch_dir=None):
+    """
+    Incremental re-dub: re-renders only the segments whose text, speaker or timing changed
+    (compared with old_segments, default: the clip cache manifest of the last render) and
+    splices them into the existing dub track at dub_path. Returns the number of re-rendered slots.
+    Falls back to a full generate_dub_audio when there is no previous track to patch.
+    """
+    print(f"--- XTTS RE-DUB ({mode.upper()}) ---")
+    if tts_model is None and tts_loader is None: tts_loader = load_tts_model
+    new = list(iter_clamped(dict(s) for s in segments))
+    if old_segments is None and clip_cache is not None:
+        old_segments = clip_cache.load_manifest()
+    if old_segments is None or not os.path.exists(dub_path):
+        print("   > No previous dub track, rendering everything")
+        tts = tts_model if tts_model is not None else tts_loader()
+        generate_dub_audio(new, dub_path, video_source_path, tts, mode=mode, audio_source=audio_source,
+                           speaker_cache=speaker_cache, clip_cache=clip_cache, scratch_dir=scratch_dir)
+        return len(new)
+    old = list(iter_clamped(dict(s) for s in old_segments))
+
+    # 1. Diff: segments that are new/edited, and old slots that no longer exist
+    old_ids = {_seg_id(s) for s in old}
+    new_ids = {_seg_id(s) for s in new}
+    affected = {i for i, s in enumerate(new) if _seg_id(s) not in old_ids}
+    dirty = [_extent(s) for s in old if _seg_id(s) not in new_ids] + [_extent(new[i]) for i in affected]
+    if not dirty:
+        print("   > Nothing changed")
+        return 0
+
+    # 2. Neighbours whose slot overlaps a dirty range are rewritten too (a later clip
+    #    overwrites the tail of an earlier one, so the write order has to be replayed)
+    grew = True
+    while grew:
+        grew = False
+        for i, s in enumerate(new):
+            if i in affected: continue
+            a, b = _extent(s)
+            if any(a < y and x < b for x, y in dirty):
+                affected.add(i)
+                dirty.append((a, b))
+                grew = True
+
+    # 3. Patch the track in place
+    data, sr = read_wav(dub_path)
+    channels = data.shape[1]
+    track = data.astype(np.float32) / 32768.0
+    for x, y in dirty:
+        track[int(round(x * sr)):int(round(y * sr))] = 0.0
+
+    renderer = ClipRenderer(mode, video_source_path, audio_source, tts=tts_model, tts_loader=tts_loader,
+                            speaker_cache=speaker_cache, clip_cache=clip_cache, scratch_dir=scratch_dir)
+    # Speaker references are anchored on each speaker's first segment, as in the full dub
+    if renderer.use_speakers:
+        for s in new: renderer._speaker_ref_hash(s)
+    try:
+        for i in sorted(affected):
+            s = new[i]
+            clip = resample(renderer.render(i, s), TTS_SAMPLE_RATE, sr)
+            a = int(round(s['start'] * sr))
+            end = max(a + len(clip), int(round(s['end'] * sr)))
+            if end > len(track):
+                track = np.concatenate((track, np.zeros((end - len(track), channels), dtype=np.float32)))
+            track[a:a + len(clip)] = np.asarray(clip, dtype=np.float32)[:, None]
+    finally:
+        renderer.close()
+
+    write_wav(dub_path, track.reshape(-1), sr, channels=channels)
+    if clip_cache is not None:
+        clip_cache.save_manifest(new)
+        clip_cache.evict()
+    print(f"   > Re-dubbed {len(affected)}/{len(new)} segments")
+    return len(affected)
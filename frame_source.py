@@ -0,0 +1,122 @@
+import subprocess
+import tempfile
+import numpy as np
+
+# Sampled frames for the visual scan, already at model resolution.
+# Only every Nth frame is decoded into an image; the rest are skipped as cheaply
+# as the backend allows. Frame n is reported at n / fps, as in the old loop.
+
+MODEL_SIZE = 224
+DECODERS = ("ffmpeg", "opencv")
+
+def probe_fps(video_path):
+    """Frame rate as OpenCV reports it (r_frame_rate), 24.0 if unknown."""
+    try:
+        cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=r_frame_rate",
+               "-of", "default=noprint_wrappers=1:nokey=1", video_path]
+        num, _, den = subprocess.check_output(cmd).decode().strip().partition("/")
+        fps = float(num) / float(den or 1)
+        return fps if fps > 0 else 24.0
+    except: return 24.0
+
+def iter_frames_opencv(video_path, frame_interval=6, size=MODEL_SIZE, start_frame=0, end_frame=None):
+    """grab() every frame, retrieve() only the sampled ones, downscale before the color conversion."""
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 24.0
+    if start_frame: cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    count = start_frame
+    try:
+        while (end_frame is None or count < end_frame) and cap.grab():
+            if (count - start_frame) % frame_interval == 0:
+                ret, frame = cap.retrieve()
+                if not ret: break
+                small = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+                yield count, count / fps, cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+            count += 1
+    finally:
+        cap.release()
+
+def iter_frames_ffmpeg(video_path, frame_interval=6, size=MODEL_SIZE, start_frame=0, end_frame=None, fps=None):
+    """
+    One ffmpeg pipe: select every Nth frame, scale to size x size, rgb24 rawvideo.
+    Each frame lands straight in a NumPy buffer; no full-resolution frame reaches Python.
+    start_frame/end_frame limit the pipe to a range (accurate input seek).
+    Raises RuntimeError if ffmpeg exits with an error, so a decode that dies halfway
+    isn't mistaken for the end of the video.
+    """
+    fps = fps or probe_fps(video_path)
+    cmd = ["ffmpeg", "-v", "error"]
+    if start_frame: cmd += ["-ss", f"{start_frame / fps:.6f}"]
+    cmd += [
+        "-i", video_path, "-an", "-sn",
+        "-vf", f"select=not(mod(n\\,{frame_interval})),scale={size}:{size}:flags=area",
+        "-vsync", "0"
+    ]
+    if end_frame is not None:
+        cmd += ["-frames:v", str(max(-(-(end_frame - start_frame) // frame_interval), 0))]
+    cmd += ["-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+    frame_bytes = size * size * 3
+    # stderr goes to a file, not a pipe: a chatty decode can't stall the frame reads
+    err = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err, bufsize=frame_bytes * 4)
+    k = 0
+    try:
+        while True:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes: break
+            n = start_frame + k * frame_interval
+            yield n, n / fps, np.frombuffer(buf, dtype=np.uint8).reshape(size, size, 3)
+            k += 1
+        if proc.wait() != 0:
+            err.seek(0)
+            detail = err.read().decode(errors="replace").strip().splitlines()
+            raise RuntimeError(f"ffmpeg exited with code {proc.returncode} after {k} frames"
+                               + (f": {detail[-1]}" if detail else ""))
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+        err.close()
+
+def iter_sampled_frames(video_path, frame_interval=6, size=MODEL_SIZE, decoder="ffmpeg",
+                        start_frame=0, end_frame=None):
+    """
+    Yields (frame index, timestamp in seconds, RGB uint8 array size x size) for every
+    frame_interval-th frame of [start_frame, end_frame). If the ffmpeg pipe fails (or
+    produces nothing), OpenCV decodes the rest; if it can't pick up where a failed pipe
+    stopped either, the ffmpeg error is raised rather than ending the scan early.
+    """
+    if decoder == "ffmpeg":
+        produced, error = False, None
+        try:
+            for item in iter_frames_ffmpeg(video_path, frame_interval, size, start_frame, end_frame):
+                produced = True
+                start_frame = item[0] + frame_interval
+                yield item
+        except FileNotFoundError:
+            pass
+        except RuntimeError as e:
+            error = e
+        if produced and error is None: return
+        if end_frame is not None and start_frame >= end_frame: return
+        print(f"   > ffmpeg frame pipe failed ({error or 'no frames'}), OpenCV from frame {start_frame}")
+        resumed = False
+        for item in iter_frames_opencv(video_path, frame_interval, size, start_frame, end_frame):
+            resumed = True
+            yield item
+        if error is not None and not resumed: raise error
+        return
+    yield from iter_frames_opencv(video_path, frame_interval, size, start_frame, end_frame)
+
+# --- Perceptual hash (frame skipping) ---
+def dhash(rgb, hash_size=8):
+    """64-bit difference hash of a frame: sign of horizontal gradients on a 9x8 grayscale thumbnail."""
+    import cv2
+    gray = cv2.cvtColor(np.ascontiguousarray(rgb), cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).reshape(-1)
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
@@ -2,9 +2,6 @@ import customtkinter as ctk
 from tkinter import filedialog
 import os
 import threading
-import subprocess
-import re
-from collections import Counter
 from settings import SettingsManager
 import time
 
@@ -45,27 +42,6 @@ FONTS = {
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
 
-# --- UTILS ---
-def clean_repetitive_text(text):
-    if not text: return ""
-    phrases = re.split(r'[.,;।]+', text)
-    phrases = [p.strip() for p in phrases if p.strip()]
-    if not phrases: return text
-    counts = Counter(phrases)
-    cleaned_phrases = []
-    seen = set()
-    has_changed = False
-    for p in phrases:
-        if counts[p] > 3:
-            if p not in seen:
-                cleaned_phrases.append(p)
-                seen.add(p)
-                has_changed = True
-        else:
-            cleaned_phrases.append(p)
-    if has_changed: return "। ".join(cleaned_phrases) + "।"
-    return text
-
 # --- MODERN WIDGETS ---
 
 class ModernSwitch(ctk.CTkSwitch):
@@ -188,8 +164,6 @@ class ReFlowStudio(ctk.CTk):
         self.queue_widgets = []
         self.is_processing = False
         self.stop_requested = False
-        self.ai_whisper = None
-        self.ai_tts = None
 
         # --- LAYOUT ---
         self.grid_columnconfigure(0, weight=0) # Sidebar Fixed
@@ -390,143 +364,42 @@ class ReFlowStudio(ctk.CTk):
 
     def run_pipeline_loop(self):
         try:
-            import torch
-            import transcriber
-            import translation
-            import dubbing
-            import censor
-            import visual_censor
-            import subtitler
+            import pipeline
         except Exception as e:
             print(f"Import Error: {e}")
             self.stat_status.set_value("Error")
             return
 
         # Use Output Folder from settings if you wish, currently defaults to "Outputs"
-        output_folder = os.path.abspath("Outputs")
-        os.makedirs(output_folder, exist_ok=True)
-
-        need_transcribe = self.chk_dub.get() or self.chk_burn_sub.get()
-        if need_transcribe and not self.ai_whisper:
-            self.ai_whisper = transcriber.load_model()
+        config = pipeline.JobConfig(
+            language=self.combo_lang.get(), dub=bool(self.chk_dub.get()), visual=bool(self.chk_visual.get()),
+            subtitles=bool(self.chk_sub.get()), censor=bool(self.chk_censor.get()), docu=bool(self.chk_docu.get()),
+            ignore_words=self.entry_ignore.get(), output_folder="Outputs", settings=self.settings_manager)
 
         total = len(self.queue_files)
+        pending = [i for i in range(total) if self.queue_widgets[i].lbl_status.cget("text") != "DONE"]
+        progress = {"done": total - len(pending)}
 
-        for i, video_path in enumerate(self.queue_files):
-            if self.stop_requested: break
-            card = self.queue_widgets[i]
-            if card.lbl_status.cget("text") == "DONE": continue 
-            
-            try:
-                base_progress = i / total
-                self.pbar_global.set(base_progress)
-                self.stat_status.set_value(f"Item {i+1}/{total}")
-                
-                video_path = os.path.abspath(video_path)
-                filename = os.path.basename(video_path)
-                
-                card.set_status("Working...", "blue")
-                card.set_progress(0.05)
-                
-                segments = []
-                current_video = video_path
-                temp_audio = None 
-                
-                # 1. Transcribe
-                if need_transcribe:
-                    card.set_status("Listening", "orange")
-                    user_terms = self.entry_ignore.get()
-                    segments = transcriber.transcribe_video(self.ai_whisper, video_path, keywords=user_terms)
-                    if self.chk_censor.get():
-                        for s in segments:
-                            if censor.check_profanity(s['text']): s['text'] += " [BEEP]"
-                card.set_progress(0.25)
-
-                # 2. Visual
-                if self.chk_visual.get():
-                    card.set_status("Scanning", "orange")
-                    timestamps = visual_censor.scan_video_for_content(video_path)
-                    if timestamps:
-                        safe_path = os.path.join(output_folder, f"Safe_{filename}")
-                        visual_censor.apply_blur_to_video(video_path, safe_path, timestamps)
-                        if os.path.exists(safe_path) and os.path.getsize(safe_path) > 1024:
-                            current_video = safe_path
-                card.set_progress(0.50)
-
-                # 3. Translate
-                mode = self.combo_lang.get().lower()
-                if need_transcribe and "original" not in mode and segments:
-                    card.set_status("Translating", "orange")
-                    combined_terms = translation.DEFAULT_TECH_TERMS.copy()
-                    if self.entry_ignore.get():
-                        combined_terms.extend([x.strip() for x in self.entry_ignore.get().split(",")])
-                    segments = translation.translate_segments(segments, target_mode=mode, tech_terms=combined_terms)
-                    for seg in segments: seg['text'] = clean_repetitive_text(seg['text'])
-
-                # 4. Dub
-                if self.chk_dub.get() and segments:
-                    card.set_status("Dubbing", "blue")
-                    temp_audio_path = os.path.join(output_folder, "temp_batch_audio.wav")
-                    if not self.ai_tts:
-                        from TTS.api import TTS
-                        device = "cuda" if torch.cuda.is_available() else "cpu"
-                        self.ai_tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(device)
-                    dubbing.generate_dub_audio(segments, temp_audio_path, current_video, self.ai_tts, mode=mode)
-                    if os.path.exists(temp_audio_path): temp_audio = temp_audio_path
-                card.set_progress(0.80)
-
-                # 5. Merge
-                card.set_status("Merging", "blue")
-                final_path = os.path.join(output_folder, f"Processed_{filename}")
-                
-                filter_complex = "" 
-                map_audio = "-map 0:a"
-                inputs = f'-i "{current_video}"'
-                
-                if temp_audio:
-                    inputs += f' -i "{temp_audio}"'
-                    if self.chk_docu.get():
-                        filter_complex = '[0:a]volume=0.2[original];[1:a]volume=1.8[dub];[original][dub]amix=inputs=2:duration=first:dropout_transition=2[a_out]'
-                        map_audio = '-map "[a_out]"'
-                    else:
-                        map_audio = '-map 1:a'
-
-                srt_path = ""
-                map_subs = ""
-                codec_subs = ""
-                if self.chk_burn_sub.get() and segments:
-                    srt_path = os.path.join(output_folder, "temp.srt")
-                    subtitler.generate_srt(segments, srt_path)
-                    inputs += f' -i "{srt_path}"'
-                    srt_index = 2 if temp_audio else 1
-                    map_subs = f'-map {srt_index}:s'
-                    codec_subs = f'-c:s mov_text -metadata:s:s:0 language={mode[:3]}'
-
-                cmd = f'ffmpeg -y -v error {inputs} '
-                if filter_complex: cmd += f'-filter_complex "{filter_complex}" '
-                
-                cmd += f'-map 0:v {map_audio} {map_subs} '
-                if current_video != video_path: cmd += '-c:v libx264 -preset fast '
-                else: cmd += '-c:v copy '
-                
-                cmd += f'-c:a aac -b:a 192k {codec_subs} -shortest "{final_path}"'
-                subprocess.run(cmd, shell=True)
-                
-                # Cleanup
-                if temp_audio and os.path.exists(temp_audio): os.remove(temp_audio)
-                if srt_path and os.path.exists(srt_path): os.remove(srt_path)
-                if current_video != video_path: 
-                    try: os.remove(current_video) 
-                    except: pass
-                
-                card.set_status("Done", "green")
-                card.set_progress(1.0)
-                self.update_stats()
-
-            except Exception as e:
-                print(f"Error: {e}")
-                card.set_status("Failed", "red")
-                card.set_progress(0.0)
+        # The engine reports per job (k = position in `pending`); map it onto the cards
+        def report(k, status=None, color="gray", progress=None):
+            card = self.queue_widgets[pending[k]]
+            if status: card.set_status(status, color)
+            if progress is not None: card.set_progress(progress)
+
+        def on_start(k):
+            self.stat_status.set_value(f"Item {pending[k]+1}/{total}")
+
+        def on_finish(k, result):
+            progress["done"] += 1
+            self.pbar_global.set(progress["done"] / total)
+            self.update_stats()
+
+        try:
+            with pipeline.PipelineEngine(config) as engine:
+                engine.run([self.queue_files[i] for i in pending], report=report, on_start=on_start,
+                           on_finish=on_finish, should_stop=lambda: self.stop_requested)
+        except Exception as e:
+            print(f"Error: {e}")
 
         self.is_processing = False
         self.pbar_global.set(1.0)
@@ -534,5 +407,8 @@ class ReFlowStudio(ctk.CTk):
         self.btn_start.configure(text="START QUEUE", state="normal", fg_color=COLORS["accent"])
 
 if __name__ == "__main__":
+    # Needed for the transcription process pool in frozen (PyInstaller) builds
+    import multiprocessing
+    multiprocessing.freeze_support()
     app = ReFlowStudio()
     app.mainloop()  
\ No newline at end of file
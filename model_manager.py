@@ -0,0 +1,217 @@
+import gc
+import importlib.util
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Central owner of the big models (Whisper, NLLB, XTTS, NSFW classifier).
+# Models load lazily and stay resident across queue items while they fit
+# the memory budget; least-recently-used models are evicted first.
+
+DEFAULT_BUDGET_MB = 8192
+AUTO_VRAM_FRACTION = 0.85   # VRAM budget when none is set: this share of GPU 0's memory
+
+def _rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+def _find_modules(obj, depth=2):
+    """Yields torch modules held by obj (the object itself or its attributes, a few levels deep)."""
+    import torch
+    if isinstance(obj, torch.nn.Module):
+        yield obj
+        return
+    if depth == 0 or not hasattr(obj, "__dict__"): return
+    for value in list(vars(obj).values()):
+        yield from _find_modules(value, depth - 1)
+
+def estimate_bytes(obj, cuda_only=False):
+    """Bytes held in parameters and buffers of every torch module reachable from obj."""
+    if importlib.util.find_spec("torch") is None: return 0
+    seen = set()
+    total = 0
+    for module in _find_modules(obj):
+        for t in list(module.parameters()) + list(module.buffers()):
+            if t.data_ptr() in seen: continue
+            if cuda_only and not t.is_cuda: continue
+            seen.add(t.data_ptr())
+            total += t.numel() * t.element_size()
+    return total
+
+def _auto_vram_bytes():
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return int(torch.cuda.get_device_properties(0).total_memory * AUTO_VRAM_FRACTION)
+    except ImportError:
+        pass
+    return None
+
+def _default_unload(model):
+    if hasattr(model, "unload"):
+        model.unload()
+
+class _Entry:
+    def __init__(self, model, size, unloader, vram=0):
+        self.model = model
+        self.size = size
+        self.vram = vram
+        self.unloader = unloader
+        self.pins = 0
+        self.last_used = time.time()
+
+class ModelManager:
+    """
+    budget_mb bounds host memory; vram_budget_mb bounds the CUDA-resident share
+    separately (None or 0 = AUTO_VRAM_FRACTION of GPU 0; no limit without CUDA).
+    """
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB, vram_budget_mb=None):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.vram_budget_bytes = _auto_vram_bytes() if not vram_budget_mb else int(vram_budget_mb * 1024 * 1024)
+        self._entries = OrderedDict()   # LRU order: oldest first
+        self._lock = threading.RLock()
+        self._call_locks = {}
+        self._load_locks = {}
+
+    def set_budget(self, budget_mb, vram_budget_mb=None):
+        with self._lock:
+            self.budget_bytes = int(budget_mb * 1024 * 1024)
+            if vram_budget_mb: self.vram_budget_bytes = int(vram_budget_mb * 1024 * 1024)
+            self._evict()
+
+    # --- Access ---
+    def get(self, name, loader, unloader=_default_unload):
+        """Returns the resident model `name`, loading it with loader() if needed."""
+        return self._get(name, loader, unloader, pin=False)
+
+    def acquire(self, name, loader, unloader=_default_unload):
+        """Like get(), but pins the model so it can't be evicted until release()."""
+        return self._get(name, loader, unloader, pin=True)
+
+    def _touch(self, name, pin):
+        entry = self._entries[name]
+        entry.last_used = time.time()
+        if pin: entry.pins += 1
+        self._entries.move_to_end(name)
+        return entry.model
+
+    def _get(self, name, loader, unloader, pin):
+        with self._lock:
+            if name in self._entries: return self._touch(name, pin)
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        # Loading can take many seconds: only callers of the same model wait for it
+        with load_lock:
+            with self._lock:
+                if name in self._entries: return self._touch(name, pin)
+            entry = self._load(name, loader, unloader)
+            if entry is None: return None
+            with self._lock:
+                self._entries[name] = entry
+                model = self._touch(name, pin)
+                self._evict(keep=name)
+                print(f"   > Model Manager: '{name}' resident ({entry.size / 1024 / 1024:.0f} MB, "
+                      f"{entry.vram / 1024 / 1024:.0f} MB VRAM), total {self.resident_bytes() / 1024 / 1024:.0f}"
+                      f"/{self.budget_bytes / 1024 / 1024:.0f} MB")
+                return model
+
+    def release(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.pins > 0:
+                entry.pins -= 1
+            self._evict()
+
+    @contextmanager
+    def use(self, name, loader, unloader=_default_unload):
+        model = self.acquire(name, loader, unloader)
+        try:
+            yield model
+        finally:
+            if model is not None: self.release(name)
+
+    def lock(self, name):
+        """Per-model lock for callers that share one model between concurrent jobs."""
+        with self._lock:
+            return self._call_locks.setdefault(name, threading.Lock())
+
+    # --- Lifecycle ---
+    def _load(self, name, loader, unloader):
+        """Runs outside the global lock (other models stay usable meanwhile)."""
+        print(f"   > Model Manager: loading '{name}'")
+        rss_before = _rss_bytes()
+        model = loader()
+        if model is None: return None
+        size = max(estimate_bytes(model), _rss_bytes() - rss_before, 0)
+        return _Entry(model, size, unloader, vram=estimate_bytes(model, cuda_only=True))
+
+    def _over_budget(self):
+        if self.resident_bytes() > self.budget_bytes: return True
+        return self.vram_budget_bytes is not None and self.resident_vram() > self.vram_budget_bytes
+
+    def _evict(self, keep=None):
+        """Drops least-recently-used, unpinned models until RAM and VRAM both fit their budgets."""
+        for name in list(self._entries.keys()):
+            if not self._over_budget(): break
+            entry = self._entries[name]
+            if name == keep or entry.pins > 0: continue
+            self._drop(name)
+
+    def _drop(self, name):
+        entry = self._entries.pop(name)
+        print(f"   > Model Manager: evicting '{name}' ({entry.size / 1024 / 1024:.0f} MB)")
+        try:
+            if entry.unloader: entry.unloader(entry.model)
+        except Exception as e:
+            print(f"   > Unload error ({name}): {e}")
+        entry.model = None
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available(): torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def unload(self, name):
+        with self._lock:
+            if name in self._entries and self._entries[name].pins == 0:
+                self._drop(name)
+
+    def unload_all(self):
+        with self._lock:
+            for name in list(self._entries.keys()):
+                if self._entries[name].pins == 0: self._drop(name)
+
+    # --- Inspect ---
+    def resident_bytes(self):
+        return sum(e.size for e in self._entries.values())
+
+    def resident_vram(self):
+        return sum(e.vram for e in self._entries.values())
+
+    def resident(self):
+        """[(name, MB, pinned)] in LRU order (next to be evicted first)."""
+        with self._lock:
+            return [(name, e.size / 1024 / 1024, e.pins > 0) for name, e in self._entries.items()]
+
+# --- Process-wide instance ---
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_manager(budget_mb=None, vram_budget_mb=None):
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ModelManager(budget_mb or DEFAULT_BUDGET_MB, vram_budget_mb)
+        elif budget_mb:
+            _manager.set_budget(budget_mb, vram_budget_mb)
+        return _manager
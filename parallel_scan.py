@@ -0,0 +1,148 @@
+import math
+import multiprocessing as mp
+import subprocess
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from frame_source import MODEL_SIZE, iter_sampled_frames, probe_fps
+
+# Sharded visual scan. The video is split into time ranges; each range is decoded
+# by its own worker process straight into a shared-memory ring buffer of
+# model-size frames. Inference threads in this process read the slots in place,
+# so frames are never pickled. No torch/transformers import here: the spawned
+# decoders stay small.
+
+RING_SLOTS_PER_WORKER = 32
+DEAD_GRACE_SEC = 2.0   # a decoder gone this long without its end marker has crashed
+
+def probe_frame_count(video_path, fps):
+    try:
+        cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+               "-of", "default=noprint_wrappers=1:nokey=1", video_path]
+        return int(math.ceil(float(subprocess.check_output(cmd).strip()) * fps))
+    except: return 0
+
+def make_shards(total_frames, workers, frame_interval=6):
+    """[(start_frame, end_frame)] aligned to the sampling grid; the last shard is open-ended."""
+    if total_frames <= 0 or workers <= 1: return [(0, None)]
+    step = int(math.ceil(total_frames / workers / frame_interval)) * frame_interval
+    starts = list(range(0, total_frames, max(step, frame_interval)))
+    return [(a, starts[k + 1] if k + 1 < len(starts) else None) for k, a in enumerate(starts)]
+
+def _decode_shard(shard_id, video_path, start_frame, end_frame, frame_interval, size, decoder,
+                  shm_name, n_slots, free_slots, filled):
+    """Worker process: decodes one shard into free ring slots, announces (slot, frame index, time)."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    error = None
+    try:
+        ring = np.ndarray((n_slots, size, size, 3), dtype=np.uint8, buffer=shm.buf)
+        for frame_idx, time_sec, rgb in iter_sampled_frames(video_path, frame_interval, size, decoder,
+                                                            start_frame, end_frame):
+            slot = free_slots.get()
+            ring[slot] = rgb
+            filled.put((slot, frame_idx, time_sec))
+        del ring
+    except Exception as e:
+        error = str(e)
+    finally:
+        shm.close()
+        filled.put((-1, shard_id, error))
+
+def scan_parallel(video_path, classify, workers=4, consumers=1, batch_size=16,
+                  frame_interval=6, size=MODEL_SIZE, decoder="ffmpeg"):
+    """
+    classify(list of RGB arrays) -> list of scores. Returns ({frame index: (time, score)},
+    unscored): every sampled frame the classifier scored, merged over all shards, and the
+    number it couldn't score. Raises RuntimeError if a decoder fails or dies, rather than
+    returning a scan with holes in it.
+    """
+    fps = probe_fps(video_path)
+    shards = make_shards(probe_frame_count(video_path, fps), workers, frame_interval)
+    n_slots = RING_SLOTS_PER_WORKER * len(shards)
+    frame_bytes = size * size * 3
+    print(f"   > Parallel scan: {len(shards)} shards, {consumers} inference consumer(s), {n_slots}-slot ring")
+
+    ctx = mp.get_context("spawn")
+    shm = shared_memory.SharedMemory(create=True, size=n_slots * frame_bytes)
+    ring = np.ndarray((n_slots, size, size, 3), dtype=np.uint8, buffer=shm.buf)
+    free_slots, filled = ctx.Queue(), ctx.Queue()
+    for slot in range(n_slots): free_slots.put(slot)
+
+    procs = [ctx.Process(target=_decode_shard, daemon=True,
+                         args=(k, video_path, a, b, frame_interval, size, decoder, shm.name, n_slots,
+                               free_slots, filled))
+             for k, (a, b) in enumerate(shards)]
+    for p in procs: p.start()
+
+    results = {}
+    lock = threading.Lock()
+    state = {"running": len(procs), "finished": set(), "dead_since": {}, "error": None, "unscored": 0}
+
+    def check_decoders():
+        """A decoder that exited without posting its end marker (OOM kill, crash) fails the scan."""
+        now = time.monotonic()
+        with lock:
+            for k, p in enumerate(procs):
+                if k in state["finished"] or p.is_alive(): continue
+                first = state["dead_since"].setdefault(k, now)
+                if now - first > DEAD_GRACE_SEC and state["error"] is None:
+                    state["error"] = RuntimeError(f"decoder shard {k} died (exit code {p.exitcode})")
+
+    def consume(ring):
+        batch = []   # (slot, frame index, time)
+        while True:
+            with lock:
+                done = state["running"] == 0 or state["error"] is not None
+            if done and not batch: return
+            item = None
+            if not done:
+                try: item = filled.get(timeout=0.1)
+                except Exception: item = None
+                if item is None: check_decoders()
+            if item is not None:
+                slot, a, b = item
+                if slot == -1:
+                    with lock:
+                        state["running"] -= 1
+                        state["finished"].add(a)
+                        if b and state["error"] is None:
+                            state["error"] = RuntimeError(f"decoder shard {a} failed: {b}")
+                else:
+                    batch.append(item)
+            if batch and (len(batch) >= batch_size or item is None or done):
+                # Read the slots in place, then hand them back to the decoders
+                frames = [ring[slot].copy() for slot, _, _ in batch]
+                for slot, _, _ in batch: free_slots.put(slot)
+                try:
+                    scores = classify(frames)
+                except Exception as e:
+                    # Retry one frame at a time; only frames that still fail go unscored
+                    print(f"   > Classifier error on a batch of {len(batch)}, retrying per frame: {e}")
+                    scores = []
+                    for (_, frame_idx, _), frame in zip(batch, frames):
+                        try: scores.append(classify([frame])[0])
+                        except Exception as e:
+                            print(f"   > Classifier error on frame {frame_idx}, skipped: {e}")
+                            scores.append(None)
+                with lock:
+                    for (_, frame_idx, time_sec), score in zip(batch, scores):
+                        if score is not None: results[frame_idx] = (time_sec, score)
+                        else: state["unscored"] += 1
+                batch = []
+
+    threads = [threading.Thread(target=consume, args=(ring,), name=f"scan-infer-{k}", daemon=True)
+               for k in range(max(consumers, 1))]
+    try:
+        for t in threads: t.start()
+        for t in threads: t.join()
+    finally:
+        for p in procs:
+            p.join(timeout=0 if state["error"] is not None else 5)
+            if p.is_alive(): p.terminate()
+        del ring
+        try: shm.close()
+        except BufferError: pass   # a consumer still holds the ring (interrupted join); freed with it
+        shm.unlink()
+    if state["error"] is not None: raise state["error"]
+    return results, state["unscored"]
@@ -0,0 +1,461 @@
+import os
+import re
+import shutil
+import subprocess
+import threading
+from collections import Counter
+from settings import SettingsManager
+
+# Headless ReFlow pipeline. Everything the GUI used to do inside
+# ReFlowStudio.run_pipeline_loop lives here: a JobConfig says what to do, a
+# PipelineEngine holds the shared models/caches and turns videos into
+# artifacts. No Tk imports, so this runs on servers without a display.
+# Progress goes out through plain callbacks; the GUI maps them to its cards.
+
+# --- UTILS ---
+def clean_repetitive_text(text):
+    if not text: return ""
+    phrases = re.split(r'[.,;।]+', text)
+    phrases = [p.strip() for p in phrases if p.strip()]
+    if not phrases: return text
+    counts = Counter(phrases)
+    cleaned_phrases = []
+    seen = set()
+    has_changed = False
+    for p in phrases:
+        if counts[p] > 3:
+            if p not in seen:
+                cleaned_phrases.append(p)
+                seen.add(p)
+                has_changed = True
+        else:
+            cleaned_phrases.append(p)
+    if has_changed: return "। ".join(cleaned_phrases) + "।"
+    return text
+
+def map_text(segments, fn):
+    """Streaming helper: rewrites seg['text'] in place as segments flow through."""
+    for seg in segments:
+        seg['text'] = fn(seg['text'])
+        yield seg
+
+def _noop(*args, **kwargs):
+    pass
+
+class JobConfig:
+    """
+    What to do with each video (the GUI's sidebar toggles). Tuning values -- models,
+    batch sizes, caches, scan mode... -- are read from `settings` (a SettingsManager),
+    with `overrides` taking precedence.
+    """
+    def __init__(self, language="Hinglish", dub=True, visual=False, subtitles=True, censor=True, docu=False,
+                 ignore_words="", output_folder="Outputs", settings=None, overrides=None):
+        self.language = language
+        self.dub = dub
+        self.visual = visual
+        self.subtitles = subtitles
+        self.censor = censor
+        self.docu = docu
+        self.ignore_words = ignore_words or ""
+        self.output_folder = os.path.abspath(output_folder)
+        self.settings = settings or SettingsManager()
+        self.overrides = dict(overrides or {})
+
+    @classmethod
+    def from_settings(cls, settings=None, **kwargs):
+        """Defaults to the toggles last saved by the GUI; keyword arguments win."""
+        settings = settings or SettingsManager()
+        saved = {
+            "language": settings.get("language") or "Hinglish",
+            "dub": settings.get("dub"), "visual": settings.get("visual"), "subtitles": settings.get("sub"),
+            "censor": settings.get("censor"), "docu": settings.get("docu"),
+        }
+        params = {k: v for k, v in saved.items() if v is not None}
+        params.update({k: v for k, v in kwargs.items() if v is not None})
+        return cls(settings=settings, **params)
+
+    def get(self, key):
+        if key in self.overrides: return self.overrides[key]
+        return self.settings.get(key)
+
+    @property
+    def mode(self):
+        return self.language.lower()
+
+    @property
+    def need_transcribe(self):
+        return bool(self.dub or self.subtitles)
+
+    @property
+    def tech_terms(self):
+        import translation
+        terms = translation.DEFAULT_TECH_TERMS.copy()
+        if self.ignore_words:
+            terms.extend([x.strip() for x in self.ignore_words.split(",")])
+        return terms
+
+class PipelineEngine:
+    """
+    Runs jobs for one JobConfig. Models stay resident across the jobs of a run,
+    and the caches are shared between them.
+
+        with PipelineEngine(config) as engine:
+            results = engine.run(["a.mp4", "b.mp4"])
+
+    Callbacks (all optional, called from worker threads):
+        report(k, status=None, color=None, progress=None) -- per-job status / progress (0..1)
+        on_start(k)                                        -- job k picked up
+        on_finish(k, result)                               -- artifacts dict or the exception
+    """
+    def __init__(self, config):
+        self.config = config
+        self.models = None
+        self.whisper_key = None
+        self.cache = None
+        self.tm = None
+        self.scores = None
+        self.scheduler = None
+        self._lock = threading.Lock()
+
+    # --- Context Manager ---
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        import transcriber
+        import transcript_cache
+        import model_manager
+        import translation_memory
+        import score_index
+        from scheduler import Scheduler
+
+        cfg = self.config
+        os.makedirs(cfg.output_folder, exist_ok=True)
+
+        # Stage slots are shared by every job of the run
+        self.scheduler = Scheduler({"cpu": cfg.get("stage_cpu_slots"), "model": cfg.get("stage_model_slots"),
+                                    "ffmpeg": cfg.get("stage_ffmpeg_slots")},
+                                   parallel=bool(cfg.get("stage_parallel")))
+
+        self.whisper_spec = transcriber.spec_from_settings(cfg)
+        self.workers = int(cfg.get("transcribe_workers"))
+
+        # Models stay resident across the queue (and across runs) while they fit the RAM and VRAM budgets
+        self.models = model_manager.get_manager(float(cfg.get("model_memory_budget_mb")),
+                                                float(cfg.get("model_vram_budget_mb") or 0))
+        self.whisper_key = f"whisper:{transcriber.spec_id(self.whisper_spec)}"
+
+        # Transcript cache: re-rendering with different toggles skips Whisper
+        cache_mb = float(cfg.get("transcript_cache_mb") or 0)
+        if cache_mb > 0:
+            self.cache = transcript_cache.TranscriptCache(
+                transcript_cache.cache_dir_for(cfg.get("model_dir")), max_mb=cache_mb)
+
+        # Translation memory: repeated lines across the queue skip NLLB
+        if cfg.get("translation_memory"):
+            self.tm = translation_memory.TranslationMemory(translation_memory.db_path_for(cfg.get("model_dir")))
+
+        # NSFW score index: re-tuning threshold/gap/padding skips the classifier
+        if cfg.get("nsfw_score_index"):
+            self.scores = score_index.ScoreIndex(score_index.cache_dir_for(cfg.get("model_dir")))
+
+    def close(self):
+        if self.tm is not None:
+            st = self.tm.stats()
+            print(f"   > Translation memory: {st['hits']} hits / {st['hits'] + st['misses']} lines this run "
+                  f"({st['hit_rate'] * 100:.0f}%), lifetime {st['total_hit_rate'] * 100:.0f}% over {st['entries']} entries")
+            self.tm.close()
+            self.tm = None
+
+    def run(self, videos, report=None, on_start=None, on_finish=None, should_stop=None):
+        """
+        Processes videos, up to max_concurrent_jobs at a time, each in its own workspace.
+        Returns {k: artifacts dict or exception} for every job that ran.
+        """
+        import workspace
+        report, on_start, on_finish = report or _noop, on_start or _noop, on_finish or _noop
+
+        def job(item):
+            k, video_path = item
+            on_start(k)
+            try:
+                result = self.process(video_path, report=lambda *a, **kw: report(k, *a, **kw))
+            except Exception as e:
+                result = e
+            with self._lock:
+                on_finish(k, result)
+            if isinstance(result, Exception): raise result
+            return result
+
+        # N jobs at a time, each in its own workspace. Models are shared; Whisper, NLLB, XTTS and
+        # the NSFW classifier each take their model_manager lock, so one call at a time per model.
+        max_jobs = max(int(self.config.get("max_concurrent_jobs") or 1), 1)
+        return workspace.run_jobs(list(enumerate(videos)), job, max_concurrent=max_jobs, should_stop=should_stop)
+
+    def build_stages(self, job):
+        """
+        The job's stage DAG. Only enabled features get a stage; the scan doesn't wait for
+        the transcript, and subtitles don't wait for the dub.
+
+            audio -> speech -> (live stream, published early) -> dub -> merge
+                     speech -> subtitles -> merge
+            scan -> blur -> merge
+        """
+        import transcriber
+        import translation
+        import dubbing
+        import censor
+        import visual_censor
+        import subtitler
+        import audio_source
+        import streaming
+        import clip_cache
+        from scheduler import Stage
+
+        cfg, models, ws = self.config, self.models, job["ws"]
+        video_path, filename, mode = job["video"], job["filename"], cfg.mode
+        stages = []
+
+        # 0. Decode the audio track once; every stage below reads this buffer
+        def decode(values, publish):
+            job["source"] = audio_source.AudioSource(video_path, scratch_dir=ws.path)
+            return {"audio": job["source"]}
+
+        # 1. Transcribe + translate. The live segment stream is published for the dub right
+        # away; the stage itself finishes (-> subtitles) once the last segment is translated.
+        def speech(values, publish):
+            source = values["audio"]
+            # Whisper is pinned only while this job transcribes; between jobs it can be evicted
+            # (e.g. to make VRAM room for XTTS). Chunked mode loads it in the pool workers instead.
+            whisper = None
+            if self.workers <= 1:
+                whisper = models.acquire(self.whisper_key, lambda: transcriber.load_model(self.whisper_spec),
+                                         unloader=None)
+            try:
+                return transcribe_and_translate(source, whisper, publish)
+            finally:
+                if whisper is not None: models.release(self.whisper_key)
+
+        def transcribe_and_translate(source, whisper, publish):
+            stream = transcriber.iter_transcribe(
+                whisper, video_path, keywords=cfg.ignore_words, audio_source=source,
+                workers=self.workers, spec=self.whisper_spec,
+                chunk_sec=float(cfg.get("transcribe_chunk_sec")),
+                cache=self.cache)
+            if whisper is not None:
+                # One in-process Whisper shared by all running jobs
+                stream = streaming.serialized(stream, models.lock("whisper"))
+            if cfg.censor:
+                stream = map_text(stream, lambda t: t + " [BEEP]" if censor.check_profanity(t) else t)
+            stream = streaming.prefetch(stream, name="transcribe")
+            job["prefetchers"].append(stream)
+            if "original" not in mode:
+                stream = translation.iter_translate_segments(
+                    stream, target_mode=mode, tech_terms=cfg.tech_terms,
+                    batch_tokens=int(cfg.get("translation_batch_tokens")),
+                    memory=self.tm, engine=cfg.get("translation_engine"),
+                    model_dir=cfg.get("model_dir"))
+                stream = map_text(stream, clean_repetitive_text)
+
+            live = streaming.Channel()
+            publish("speech_stream", live)
+            segments = []
+            try:
+                for seg in stream:
+                    segments.append(seg)
+                    live.put(seg)
+            except BaseException as e:
+                live.close(e)
+                raise
+            live.close()
+            return {"segments": segments}
+
+        # 2. Visual
+        def scan(values, publish):
+            return {"blur_intervals": visual_censor.scan_video_for_content(
+                video_path, batch_size=int(cfg.get("visual_batch_size")),
+                decoder=cfg.get("visual_decoder"),
+                mode=cfg.get("visual_scan_mode"),
+                workers=int(cfg.get("visual_scan_workers")),
+                index=self.scores,
+                threshold=float(cfg.get("visual_threshold")),
+                gap=float(cfg.get("visual_gap_sec")),
+                padding=float(cfg.get("visual_padding_sec")))}
+
+        def blur(values, publish):
+            timestamps = values["blur_intervals"]
+            if not timestamps: return {"video": video_path}
+            safe_path = ws.file(f"Safe_{filename}", large=True)
+            visual_censor.apply_blur_to_video(
+                video_path, safe_path, timestamps,
+                smart=cfg.get("blur_render") == "smart", scratch_dir=ws.disk_path)
+            # Blur was asked for: never fall back to the unblurred source
+            if not os.path.exists(safe_path) or os.path.getsize(safe_path) <= 1024:
+                raise RuntimeError(f"Blurred video missing for {filename}")
+            return {"video": safe_path}
+
+        # 3. Dub (pulls from the live stream; the original video is the voice reference)
+        def dub(values, publish):
+            source, segments = values["audio"], []
+            temp_audio_path = ws.file("dub_track.wav")
+            # Clip cache: re-rendering this job only synthesizes edited lines
+            clips = None
+            clip_mb = float(cfg.get("dub_clip_cache_mb") or 0)
+            if clip_mb > 0 and source is not None:
+                clips = clip_cache.ClipCache(clip_cache.cache_dir_for(cfg.get("model_dir")),
+                                             clip_cache.job_id(source.content_hash(), mode), max_mb=clip_mb)
+            # Incremental re-dub: the last render's track + segment list live in the job's clip
+            # cache folder (same size limit); only edited lines are re-synthesized and spliced in
+            incremental = clips is not None and cfg.get("dub_incremental")
+            previous = clips.load_track() if incremental else None
+
+            with models.lock("xtts"):
+                if previous is not None:
+                    shutil.copyfile(previous[0], temp_audio_path)
+                    segments = list(values["speech_stream"])
+                    pinned = []
+
+                    def load_tts():
+                        pinned.append(True)
+                        return models.acquire("xtts", dubbing.load_tts_model, unloader=None)
+                    try:
+                        dubbing.redub_segments(segments, temp_audio_path, video_path, mode=mode, audio_source=source,
+                                               clip_cache=clips, tts_loader=load_tts, old_segments=previous[1],
+                                               speaker_cache=cfg.get("tts_speaker_cache"), scratch_dir=ws.path)
+                    finally:
+                        if pinned: models.release("xtts")
+                else:
+                    # Copies: the dub clamps overlapping ends in place, while the subtitles
+                    # stage reads the same segments concurrently
+                    stream = (dict(s) for s in values["speech_stream"])
+                    with models.use("xtts", dubbing.load_tts_model, unloader=None) as ai_tts:
+                        dubbing.generate_dub_audio(streaming.tee_into(stream, segments),
+                                                   temp_audio_path, video_path, ai_tts, mode=mode, audio_source=source,
+                                                   speaker_cache=cfg.get("tts_speaker_cache"),
+                                                   pipeline=cfg.get("dub_pipeline"),
+                                                   clip_cache=clips, scratch_dir=ws.path)
+            ok = segments and os.path.exists(temp_audio_path)
+            if ok and incremental:
+                clips.save_track(temp_audio_path)
+                clips.evict()
+            return {"dub_track": temp_audio_path if ok else None}
+
+        # 4. Subtitles (as soon as the translation is complete)
+        def subtitles(values, publish):
+            if not values["segments"]: return {"srt": None}
+            srt_path = ws.file("subs.srt")
+            subtitler.generate_srt(values["segments"], srt_path)
+            return {"srt": srt_path}
+
+        # 5. Merge
+        def merge(values, publish):
+            current_video = values.get("video", video_path)
+            temp_audio = values.get("dub_track")
+            srt_path = values.get("srt")
+            final_path = os.path.join(cfg.output_folder, f"Processed_{filename}")
+
+            filter_complex = ""
+            map_audio = "-map 0:a"
+            inputs = f'-i "{current_video}"'
+
+            if temp_audio:
+                # Docu-Mix stays in ffmpeg: the shared 24 kHz mono buffer is for analysis,
+                # the output keeps the source's channels and bandwidth
+                if cfg.docu:
+                    inputs += f' -i "{temp_audio}"'
+                    filter_complex = '[0:a]volume=0.2[original];[1:a]volume=1.8[dub];[original][dub]amix=inputs=2:duration=first:dropout_transition=2[a_out]'
+                    map_audio = '-map "[a_out]"'
+                else:
+                    inputs += f' -i "{temp_audio}"'
+                    map_audio = '-map 1:a'
+
+            map_subs = ""
+            codec_subs = ""
+            if srt_path:
+                inputs += f' -i "{srt_path}"'
+                srt_index = 2 if temp_audio else 1
+                map_subs = f'-map {srt_index}:s'
+                codec_subs = f'-c:s mov_text -metadata:s:s:0 language={mode[:3]}'
+
+            cmd = f'ffmpeg -y -v error {inputs} '
+            if filter_complex: cmd += f'-filter_complex "{filter_complex}" '
+
+            cmd += f'-map 0:v {map_audio} {map_subs} '
+            # The blurred video is already the final H.264 encode, so video is always copied
+            cmd += '-c:v copy '
+
+            cmd += f'-c:a aac -b:a 192k {codec_subs} -shortest "{final_path}"'
+            if subprocess.run(cmd, shell=True).returncode != 0:
+                raise RuntimeError(f"ffmpeg merge failed for {filename}")
+            return {"output": final_path}
+
+        merge_inputs = []
+        if cfg.need_transcribe:
+            stages.append(Stage("audio", decode, outputs=["audio"], resource="cpu", label="Decoding"))
+            stages.append(Stage("speech", speech, inputs=["audio"], outputs=["speech_stream", "segments"],
+                                resource="model", label="Listening"))
+            if cfg.dub:
+                stages.append(Stage("dub", dub, inputs=["audio", "speech_stream"], outputs=["dub_track"],
+                                    resource="model", label="Dubbing"))
+                merge_inputs.append("dub_track")
+            if cfg.subtitles:
+                stages.append(Stage("subtitles", subtitles, inputs=["segments"], outputs=["srt"],
+                                    resource="cpu", label="Subtitles"))
+                merge_inputs.append("srt")
+        if cfg.visual:
+            stages.append(Stage("scan", scan, outputs=["blur_intervals"], resource="model", label="Scanning"))
+            stages.append(Stage("blur", blur, inputs=["blur_intervals"], outputs=["video"],
+                                resource="ffmpeg", label="Blurring"))
+            merge_inputs.append("video")
+        stages.append(Stage("merge", merge, inputs=merge_inputs, outputs=["output"], resource="ffmpeg",
+                            label="Merging"))
+        return stages
+
+    def process(self, video_path, report=None):
+        """One video, start to finish, inside its own workspace (safe to run concurrently). Returns its artifacts."""
+        import workspace
+
+        report = report or _noop
+        video_path = os.path.abspath(video_path)
+        job = {
+            "video": video_path, "filename": os.path.basename(video_path), "source": None, "prefetchers": [],
+            "ws": workspace.JobWorkspace(video_path, tmpfs=bool(self.config.get("workspace_tmpfs"))),
+        }
+
+        try:
+            report("Working...", "blue", 0.05)
+            stages = self.build_stages(job)
+            done = []
+
+            def on_stage(stage, event):
+                if event == "start":
+                    report(stage.label, "blue" if stage.resource == "ffmpeg" or stage.name == "dub" else "orange")
+                else:
+                    done.append(stage.name)
+                    report(progress=0.05 + 0.95 * len(done) / len(stages))
+
+            values, timings = self.scheduler.run(stages, on_stage=on_stage)
+            print(f"   > Stages ({job['filename']}): " + ", ".join(f"{s.name} {timings.get(s.name, 0):.1f}s" for s in stages))
+
+            report("Done", "green", 1.0)
+            return {
+                "input": video_path, "output": values["output"], "segments": values.get("segments") or [],
+                "blur_intervals": values.get("blur_intervals") or [],
+                "blurred": values.get("video", video_path) != video_path,
+                "dubbed": bool(values.get("dub_track")), "subtitles": bool(values.get("srt")),
+                "timings": timings,
+            }
+
+        except Exception as e:
+            print(f"Error: {e}")
+            report("Failed", "red", 0.0)
+            raise
+        finally:
+            for p in job["prefetchers"]: p.close()
+            if job["source"] is not None: job["source"].close()
+            # Cleanup: every intermediate of this job lives in its workspace
+            job["ws"].close()
@@ -0,0 +1,98 @@
+import argparse
+import glob
+import os
+import sys
+
+# Headless entry point: python reflow.py "videos/*.mp4" other.mkv --blur --lang Hindi
+# Toggles default to whatever the GUI last saved; flags override them.
+
+VIDEO_EXTS = (".mp4", ".mkv", ".mov", ".avi")
+
+def expand_inputs(patterns):
+    """Files, directories (their videos) and glob patterns -> unique paths, in order."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(os.path.join(pattern, name) for name in os.listdir(pattern)
+                             if name.lower().endswith(VIDEO_EXTS))
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            matches = [pattern]
+        for path in matches:
+            path = os.path.abspath(path)
+            if path not in paths: paths.append(path)
+    return paths
+
+def _value(text):
+    """--set values: JSON-ish scalars (numbers, true/false), strings otherwise."""
+    low = text.lower()
+    if low in ("true", "false"): return low == "true"
+    for cast in (int, float):
+        try: return cast(text)
+        except ValueError: pass
+    return text
+
+def _toggle(parser, name, help_text):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(f"--{name}", dest=name.replace("-", "_"), action="store_true", default=None, help=help_text)
+    group.add_argument(f"--no-{name}", dest=name.replace("-", "_"), action="store_false")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="reflow", description="ReFlow headless batch processing")
+    parser.add_argument("inputs", nargs="+", help="video files, directories or glob patterns (quote them)")
+    parser.add_argument("-o", "--output", default="Outputs", help="output folder (default: Outputs)")
+    parser.add_argument("--lang", dest="language", help="Hinglish, Hindi, English")
+    _toggle(parser, "dub", "AI dubbing")
+    _toggle(parser, "blur", "visual blur (NSFW)")
+    _toggle(parser, "subs", "subtitle track")
+    _toggle(parser, "censor", "censor audio")
+    _toggle(parser, "docu", "Docu-Mix mode")
+    parser.add_argument("--ignore", default="", help="comma-separated words to keep untranslated")
+    parser.add_argument("-j", "--jobs", type=int, help="videos processed at a time (max_concurrent_jobs)")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a setting for this run, e.g. --set visual_scan_mode=parallel")
+    args = parser.parse_args(argv)
+
+    import pipeline
+
+    videos = expand_inputs(args.inputs)
+    missing = [p for p in videos if not os.path.isfile(p)]
+    for path in missing: print(f"   > Not found: {path}")
+    videos = [p for p in videos if p not in missing]
+    if not videos:
+        print("--- No input videos ---")
+        return 2
+
+    overrides = {}
+    for item in args.set:
+        key, sep, value = item.partition("=")
+        if not sep: parser.error(f"--set expects KEY=VALUE, got '{item}'")
+        overrides[key.strip()] = _value(value.strip())
+    if args.jobs: overrides["max_concurrent_jobs"] = args.jobs
+
+    config = pipeline.JobConfig.from_settings(
+        language=args.language, dub=args.dub, visual=args.blur, subtitles=args.subs,
+        censor=args.censor, docu=args.docu, ignore_words=args.ignore, output_folder=args.output)
+    config.overrides.update(overrides)
+
+    print(f"--- ReFlow: {len(videos)} video(s) -> {config.output_folder} ---")
+
+    def report(k, status=None, color=None, progress=None):
+        if status: print(f"   > [{k + 1}/{len(videos)}] {os.path.basename(videos[k])}: {status}")
+
+    with pipeline.PipelineEngine(config) as engine:
+        results = engine.run(videos, report=report)
+
+    failed = [videos[k] for k, r in results.items() if isinstance(r, Exception)]
+    print(f"--- Done: {len(results) - len(failed)} ok, {len(failed)} failed ---")
+    for k, result in sorted(results.items()):
+        if isinstance(result, Exception): print(f"   > FAILED {videos[k]}: {result}")
+        else: print(f"   > {result['output']}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    # Needed for the transcription process pool in frozen (PyInstaller) builds
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import threading
+import time
+
+# Stage DAG scheduler. A job is a set of stages with declared inputs/outputs and
+# a resource class; every stage whose inputs are available runs right away, on
+# its own thread, as long as its resource class has a free slot. Slots are
+# shared by all jobs running on the same Scheduler.
+#
+# A stage can publish an output before it returns (e.g. a segment stream), so
+# its consumers start while it is still producing.
+
+RESOURCES = ("cpu", "model", "ffmpeg")
+DEFAULT_LIMITS = {"cpu": 2, "model": 2, "ffmpeg": 2}
+
+class Stage:
+    """
+    fn(values, publish) -> dict of outputs. `values` holds every input (and the job's
+    initial values); publish(name, value) makes an output available early.
+    """
+    def __init__(self, name, fn, inputs=(), outputs=(), resource="cpu", label=None):
+        if resource not in RESOURCES: raise ValueError(f"Unknown resource class '{resource}'")
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.resource = resource
+        self.label = label or name
+
+    def __repr__(self):
+        return f"Stage({self.name}, {self.resource}, {list(self.inputs)} -> {list(self.outputs)})"
+
+def check_graph(stages, initial=()):
+    """Raises ValueError on duplicate outputs, missing inputs or cycles; returns stages in topological order."""
+    producers = {}
+    for stage in stages:
+        for out in stage.outputs:
+            if out in producers or out in initial:
+                raise ValueError(f"Output '{out}' is produced twice")
+            producers[out] = stage
+    for stage in stages:
+        for name in stage.inputs:
+            if name not in producers and name not in initial:
+                raise ValueError(f"Stage '{stage.name}' needs '{name}', which nothing produces")
+
+    order, available, remaining = [], set(initial), list(stages)
+    while remaining:
+        ready = [s for s in remaining if all(n in available for n in s.inputs)]
+        if not ready: raise ValueError(f"Cycle between stages: {[s.name for s in remaining]}")
+        for s in ready:
+            order.append(s)
+            available.update(s.outputs)
+            remaining.remove(s)
+    return order
+
+class Scheduler:
+    """
+    limits: {resource class: concurrent stages}. parallel=False runs the stages one
+    at a time in topological order (the old strictly sequential pipeline).
+    """
+    def __init__(self, limits=None, parallel=True):
+        limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.limits = {k: max(int(v), 1) for k, v in limits.items()}
+        self.parallel = parallel
+        self._slots = {k: threading.Semaphore(n) for k, n in self.limits.items()}
+
+    def run(self, stages, values=None, on_stage=None):
+        """
+        Runs one job's DAG. on_stage(stage, event) is called with "start" / "done".
+        Returns (values, {stage name: seconds}); re-raises the first stage error once
+        the stages already running have finished.
+        """
+        values = dict(values or {})
+        order = check_graph(stages, initial=values)
+        on_stage = on_stage or (lambda stage, event: None)
+        timings = {}
+
+        if not self.parallel:
+            for stage in order:
+                self._run_stage(stage, values, timings, on_stage, lambda n, v: values.__setitem__(n, v))
+            return values, timings
+
+        cond = threading.Condition()
+        state = {"error": None, "running": 0}
+        started = set()
+
+        def publish(name, value):
+            with cond:
+                values[name] = value
+                cond.notify_all()
+
+        def worker(stage):
+            try:
+                self._run_stage(stage, values, timings, on_stage, publish, cond)
+            except BaseException as e:
+                with cond:
+                    if state["error"] is None: state["error"] = e
+            finally:
+                with cond:
+                    state["running"] -= 1
+                    cond.notify_all()
+
+        with cond:
+            while True:
+                if state["error"] is None:
+                    for stage in order:
+                        if stage.name in started: continue
+                        if all(n in values for n in stage.inputs):
+                            started.add(stage.name)
+                            state["running"] += 1
+                            threading.Thread(target=worker, args=(stage,), name=f"stage-{stage.name}",
+                                             daemon=True).start()
+                if state["running"] == 0:
+                    break
+                cond.wait()
+
+        if state["error"] is not None: raise state["error"]
+        return values, timings
+
+    def _run_stage(self, stage, values, timings, on_stage, publish, cond=None):
+        slot = self._slots[stage.resource]
+        with slot:
+            if cond is not None:
+                with cond: inputs = {n: values[n] for n in values}
+            else:
+                inputs = dict(values)
+            on_stage(stage, "start")
+            t0 = time.perf_counter()
+            outputs = stage.fn(inputs, publish) or {}
+            timings[stage.name] = time.perf_counter() - t0
+        for name in stage.outputs:
+            if name in outputs:
+                publish(name, outputs[name])
+            elif name not in values:
+                publish(name, None)
+        on_stage(stage, "done")
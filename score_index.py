@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+# Per-frame NSFW score index. The scan stores every sampled (timestamp, score)
+# pair, keyed by the video content + classifier model, so blur intervals can be
+# rebuilt with any threshold / gap / padding without running the classifier again.
+
+INDEX_VERSION = 1
+SAMPLE_BYTES = 1 << 20   # Content hash reads 1 MB at the start, middle and end
+
+def cache_dir_for(model_dir):
+    return os.path.join(model_dir, "cache", "nsfw_scores")
+
+def content_hash(video_path):
+    """Sampled content hash: file size + three 1 MB slices. Cheap even for 4K masters."""
+    size = os.path.getsize(video_path)
+    h = hashlib.sha256(str(size).encode())
+    with open(video_path, "rb") as f:
+        for offset in sorted({0, max(size // 2 - SAMPLE_BYTES // 2, 0), max(size - SAMPLE_BYTES, 0)}):
+            f.seek(offset)
+            h.update(f.read(SAMPLE_BYTES))
+    return h.hexdigest()
+
+def make_key(video_hash, model_id, mode, frame_interval):
+    raw = json.dumps([INDEX_VERSION, video_hash, model_id, mode, frame_interval])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ScoreIndex:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def load(self, key):
+        """(times, scores) float32 arrays, or None."""
+        try:
+            with np.load(self._path(key), allow_pickle=False) as data:
+                return data["times"], data["scores"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, key, times, scores, meta=None):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                with open(tmp, "wb") as f:
+                    np.savez_compressed(f, times=np.asarray(times, dtype=np.float32),
+                                        scores=np.asarray(scores, dtype=np.float32),
+                                        meta=np.array(json.dumps(meta or {})))
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"   > Score index write failed: {e}")
+                if os.path.exists(tmp): os.remove(tmp)
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npz"):
+                    try: os.remove(os.path.join(self.cache_dir, name))
+                    except OSError: pass
+
+def intervals_from_scores(times, scores, threshold=0.60, gap=4.0, padding=1.0):
+    """Blur intervals from stored scores, with any threshold / gap / padding."""
+    from visual_censor import merge_timestamps_with_gap_filling
+    times = np.asarray(times, dtype=np.float64)
+    hits = times[np.asarray(scores) > threshold]
+    return merge_timestamps_with_gap_filling(hits.tolist(), gap_limit=gap, padding=padding)
+
+if __name__ == "__main__":
+    import argparse
+    from settings import SettingsManager
+
+    parser = argparse.ArgumentParser(description="Rebuild blur intervals from a stored NSFW score index")
+    parser.add_argument("video")
+    parser.add_argument("--threshold", type=float, default=0.60)
+    parser.add_argument("--gap", type=float, default=4.0)
+    parser.add_argument("--padding", type=float, default=1.0)
+    parser.add_argument("--mode", default="fixed", help="scan mode the index was built with (fixed/adaptive)")
+    args = parser.parse_args()
+
+    from visual_censor import NSFW_MODEL_ID, FRAME_INTERVAL
+    index = ScoreIndex(cache_dir_for(SettingsManager().get("model_dir")))
+    entry = index.load(make_key(content_hash(args.video), NSFW_MODEL_ID, args.mode, FRAME_INTERVAL))
+    if entry is None:
+        print("--- No score index for this video (scan it once first) ---")
+    else:
+        for start, end in intervals_from_scores(*entry, threshold=args.threshold, gap=args.gap, padding=args.padding):
+            print(f"{start:9.2f}  {end:9.2f}")
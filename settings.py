@@ -8,7 +8,38 @@ DEFAULT_SETTINGS = {
     "color_theme": "blue",        # blue, green, dark-blue
     "output_folder": "output",
     "model_dir": "models",
-    "last_input_file": ""
+    "last_input_file": "",
+    "whisper_model": "base",       # tiny, base, small, medium
+    "whisper_backend": "whisper",  # whisper, whisper-int8, faster-whisper
+    "whisper_compute_type": "auto",# auto, float32, float16, int8 (faster-whisper)
+    "transcribe_workers": 1,       # > 1 = chunked parallel transcription (CPU)
+    "transcribe_chunk_sec": 60,
+    "transcript_cache_mb": 512,    # 0 = disable transcript cache
+    "model_memory_budget_mb": 8192,# Resident models (Whisper, NLLB, XTTS, NSFW) are evicted LRU above this
+    "model_vram_budget_mb": 0,     # Same for the GPU-resident share; 0 = 85% of the GPU's memory
+    "translation_batch_tokens": 4096,
+    "translation_memory": True,    # Reuse translations of repeated lines (SQLite, under model_dir)
+    "translation_engine": "torch", # torch, int8 (quantized CPU), onnx (ONNX Runtime, CPU)
+    "tts_speaker_cache": True,     # XTTS latents computed once per speaker instead of per segment
+    "dub_pipeline": "overlapped",  # overlapped (TTS || clip post-processing), sequential
+    "dub_clip_cache_mb": 2048,     # 0 = disable. Re-renders only synthesize changed lines
+    "dub_incremental": True,       # Keep the last dub track in the clip cache; re-runs only re-dub edited lines
+    "max_concurrent_jobs": 1,      # Videos processed at the same time (each in its own workspace)
+    "workspace_tmpfs": False,      # Job scratch files in /dev/shm when available
+    "visual_batch_size": 16,       # Frames per NSFW classifier forward pass
+    "visual_decoder": "ffmpeg",    # ffmpeg (select+scale pipe), opencv (grab/retrieve)
+    "visual_scan_mode": "fixed",   # fixed (every 6th frame), adaptive (coarse + hash skip + dense refine),
+                                   # parallel (fixed, decoded in time shards by worker processes)
+    "visual_scan_workers": 4,      # Decoder processes for the parallel scan
+    "visual_threshold": 0.60,      # NSFW score that counts as a detection
+    "visual_gap_sec": 4.0,         # Detections closer than this are merged into one blur
+    "visual_padding_sec": 1.0,     # Blur before/after each detection
+    "nsfw_score_index": True,      # Keep per-frame scores so the values above can change without a rescan
+    "blur_render": "smart",        # smart = re-encode only blurred GOPs, full = re-encode the whole video
+    "stage_parallel": True,        # Run independent stages (e.g. visual scan + Whisper) at the same time
+    "stage_cpu_slots": 2,          # Concurrent stages per resource class, shared by all running jobs
+    "stage_model_slots": 2,
+    "stage_ffmpeg_slots": 2
 }
 
 class SettingsManager:
@@ -0,0 +1,156 @@
+import bisect
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+# Smart render for Visual Blur: only the GOPs that overlap a blur interval are
+# re-encoded; everything else is stream-copied. Pieces are cut on keyframes,
+# written as MPEG-TS (in-band SPS/PPS, so re-encoded and copied pieces can sit
+# side by side) and joined with the concat demuxer.
+
+SUPPORTED_CODECS = ("h264",)
+DURATION_TOLERANCE = 0.1   # seconds the joined output may differ from the source
+
+def _run(cmd, cwd=None):
+    return subprocess.run(cmd, cwd=cwd, capture_output=True).returncode == 0
+
+def probe_video(path):
+    """Codec parameters of the first video stream + container duration (None on failure)."""
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "stream=codec_name,profile,level,pix_fmt,width,height,r_frame_rate,bit_rate,nb_frames"
+           ":format=duration,start_time",
+           "-of", "json", path]
+    try:
+        info = json.loads(subprocess.check_output(cmd))
+        stream = info["streams"][0]
+        stream["duration"] = float(info["format"]["duration"])
+        try: stream["start_time"] = float(info["format"].get("start_time") or 0.0)
+        except ValueError: stream["start_time"] = 0.0
+        return stream
+    except: return None
+
+def probe_keyframes(path, start_time=0.0):
+    """
+    Sorted keyframe timestamps (packet flags, no decode), relative to the file's
+    start_time -- the same timeline as the blur intervals and the -ss/-t cuts.
+    """
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path]
+    try:
+        out = subprocess.check_output(cmd).decode()
+    except: return []
+    keyframes = []
+    for line in out.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags and pts not in ("", "N/A"):
+            keyframes.append(max(float(pts) - start_time, 0.0))
+    return sorted(set(keyframes))
+
+def count_frames(path):
+    """Video packet count of the first video stream (no decode), 0 if unknown."""
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-count_packets",
+           "-show_entries", "stream=nb_read_packets", "-of", "csv=p=0", path]
+    try: return int(subprocess.check_output(cmd).decode().strip().splitlines()[0])
+    except: return 0
+
+def plan_pieces(intervals, keyframes, duration):
+    """
+    [(start, end, encode)] covering [0, duration]. Every blur interval is widened to the
+    enclosing keyframes (GOP boundaries); overlapping widened ranges are merged.
+    """
+    if not keyframes or keyframes[0] > 0.0: keyframes = [0.0] + list(keyframes)
+    dirty = []
+    for start, end in sorted(intervals):
+        a = keyframes[max(bisect.bisect_right(keyframes, start) - 1, 0)]
+        k = bisect.bisect_right(keyframes, end)
+        b = keyframes[k] if k < len(keyframes) else duration
+        if dirty and a <= dirty[-1][1]: dirty[-1][1] = max(dirty[-1][1], b)
+        else: dirty.append([a, b])
+
+    pieces, pos = [], 0.0
+    for a, b in dirty:
+        if a > pos: pieces.append((pos, a, False))
+        pieces.append((a, min(b, duration), True))
+        pos = b
+    if pos < duration: pieces.append((pos, duration, False))
+    return [p for p in pieces if p[1] - p[0] > 1e-3]
+
+def _encoder_args(params):
+    """libx264 settings matching the source stream so the pieces concatenate cleanly."""
+    args = ["-c:v", "libx264", "-preset", "fast", "-crf", "18", "-pix_fmt", params.get("pix_fmt") or "yuv420p"]
+    profile = (params.get("profile") or "").lower()
+    if profile in ("baseline", "constrained baseline", "main", "high"):
+        args += ["-profile:v", "baseline" if "baseline" in profile else profile]
+    level = params.get("level")
+    if isinstance(level, int) and level > 0:
+        args += ["-level:v", f"{level / 10:.1f}"]
+    return args
+
+def smart_render_blur(input_path, output_path, intervals, scratch_dir=None):
+    """
+    Blurs `intervals` re-encoding only the affected GOPs. Returns True on success,
+    False if the source can't be smart-rendered (caller falls back to a full encode).
+    """
+    from visual_censor import _merge_intervals, write_blur_commands
+
+    intervals = _merge_intervals(intervals or [])
+    if not intervals: return False
+    params = probe_video(input_path)
+    if params is None or params.get("codec_name") not in SUPPORTED_CODECS:
+        print("   > Smart render: unsupported source codec, full re-encode")
+        return False
+    keyframes = probe_keyframes(input_path, params["start_time"])
+    if not keyframes:
+        return False
+
+    pieces = plan_pieces(intervals, keyframes, params["duration"])
+    encoded = sum(b - a for a, b, enc in pieces if enc)
+    print(f"--- Smart Render: re-encoding {encoded:.1f}s of {params['duration']:.1f}s "
+          f"({sum(1 for p in pieces if p[2])} ranges), stream-copying the rest ---")
+
+    work = tempfile.mkdtemp(prefix="reflow_smart_", dir=scratch_dir)
+    try:
+        names = []
+        for k, (a, b, encode) in enumerate(pieces):
+            name = f"piece_{k:04d}.ts"
+            cmd = ["ffmpeg", "-y", "-v", "error", "-ss", f"{a:.6f}", "-i", os.path.abspath(input_path),
+                   "-t", f"{b - a:.6f}", "-map", "0:v:0", "-an", "-sn"]
+            if encode:
+                # Blur timeline relative to the start of this piece
+                local = [[max(s - a, 0.0), e - a] for s, e in intervals if e > a and s < b]
+                cmd_file = f"piece_{k:04d}.cmd"
+                write_blur_commands(os.path.join(work, cmd_file), local)
+                cmd += ["-vf", f"sendcmd=f={cmd_file},boxblur@zone=50:5:enable=0"] + _encoder_args(params)
+            else:
+                cmd += ["-c:v", "copy", "-bsf:v", "h264_mp4toannexb"]
+            cmd += ["-f", "mpegts", name]
+            if not _run(cmd, cwd=work):
+                print(f"   > Smart render: piece {k} failed, full re-encode")
+                return False
+            names.append(name)
+
+        with open(os.path.join(work, "pieces.txt"), "w", encoding="utf-8") as f:
+            for name in names: f.write(f"file '{name}'\n")
+
+        # Join the video pieces and copy the original audio back in. avc3: the re-encoded
+        # pieces carry their own SPS/PPS in-band, a single avc1 'avcC' can't describe them all.
+        cmd = ["ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", "pieces.txt",
+               "-i", os.path.abspath(input_path), "-map", "0:v:0", "-map", "1:a?",
+               "-c", "copy", "-tag:v", "avc3", os.path.abspath(output_path)]
+        if not _run(cmd, cwd=work):
+            print("   > Smart render: join failed, full re-encode")
+            return False
+
+        # Only accept the join if it has the source's length and frame count
+        joined = probe_video(output_path)
+        src_frames, out_frames = count_frames(input_path), count_frames(output_path)
+        if (joined is None or abs(joined["duration"] - params["duration"]) > DURATION_TOLERANCE
+                or not src_frames or src_frames != out_frames):
+            print(f"   > Smart render: output doesn't match the source "
+                  f"({out_frames} vs {src_frames} frames), full re-encode")
+            return False
+        return True
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
@@ -0,0 +1,164 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from audio_dsp import detect_nonsilent
+
+# XTTS speaker conditioning cache. tts.tts(speaker_wav=...) recomputes the GPT
+# conditioning latents + speaker embedding for every segment; here they are
+# computed ONCE per speaker (voice_label) from a few longer, clean reference
+# windows and reused for every segment through the latent-based inference API.
+
+REF_MAX_SEC = 12.0      # Total reference audio per speaker
+REF_MIN_WINDOW = 1.0    # Ignore voiced stretches shorter than this
+REF_SEARCH_SEC = 60.0   # Look this far past the speaker's first segment
+
+def xtts_model(tts):
+    """The underlying Xtts model of a TTS.api.TTS object, or None if it has no latent API."""
+    model = getattr(getattr(tts, "synthesizer", None), "tts_model", None)
+    if model is None or not hasattr(model, "get_conditioning_latents") or not hasattr(model, "inference"):
+        return None
+    return model
+
+def pick_reference_windows(audio_source, start, max_sec=REF_MAX_SEC,
+                           min_window=REF_MIN_WINDOW, search_sec=REF_SEARCH_SEC):
+    """
+    [(start, duration)] of the longest voiced stretches in [start, start + search_sec),
+    up to max_sec in total. Longer windows give XTTS steadier latents than one short segment.
+    """
+    sr = audio_source.sample_rate
+    region = audio_source.float32(start, search_sec)
+    ranges = [(a, b) for a, b in detect_nonsilent(region, sr, min_silence_len=0.3, silence_thresh=-40)
+              if b - a >= min_window * sr]
+    # Skip clipped stretches (music stings, shouting) -- they make poor references
+    ranges = [(a, b) for a, b in ranges if np.mean(np.abs(region[a:b]) > 0.99) < 0.001]
+
+    windows, total = [], 0.0
+    for a, b in sorted(ranges, key=lambda r: r[0] - r[1]):
+        dur = min((b - a) / sr, max_sec - total)
+        if dur < min_window: break
+        windows.append((start + a / sr, dur))
+        total += dur
+    return sorted(windows)
+
+def speaker_windows(audio_source, seg):
+    """Reference windows for the speaker of `seg` (falls back to the segment itself)."""
+    windows = pick_reference_windows(audio_source, seg['start'])
+    if not windows:
+        # Nothing clean nearby: use the segment itself (same as the old per-segment ref)
+        windows = [(seg['start'], max(seg['end'] - seg['start'], 0.5))]
+    return windows
+
+def reference_hash(audio_source, windows):
+    """Identity of a speaker reference: hash of the exact samples the latents are built from."""
+    h = hashlib.sha1()
+    for start, dur in windows:
+        h.update(np.ascontiguousarray(audio_source.slice(start, dur)).tobytes())
+    return h.hexdigest()
+
+class SpeakerCache:
+    """
+    Per-job cache of (gpt_cond_latent, speaker_embedding), keyed by voice_label.
+    supported is False when the loaded TTS model isn't XTTS -- callers then fall back
+    to per-segment speaker_wav.
+    windows: optional {voice_label: [(start, dur)]} shared with the caller, so the
+             reference of each speaker is fixed before any latents are computed.
+    """
+    def __init__(self, tts, audio_source=None, scratch_dir=None, windows=None):
+        self.tts = tts
+        self.model = xtts_model(tts)
+        self.audio_source = audio_source
+        self.supported = self.model is not None and audio_source is not None and len(audio_source.samples) > 0
+        self._latents = {}
+        self.windows = windows if windows is not None else {}
+        self._scratch = tempfile.mkdtemp(prefix="reflow_spk_", dir=scratch_dir)
+
+        # Latency bookkeeping for report()
+        self.cond_time = 0.0
+        self.cond_count = 0
+        self.synth_time = 0.0
+        self.synth_count = 0
+
+    @property
+    def output_sample_rate(self):
+        audio_cfg = getattr(getattr(self.model, "config", None), "audio", None)
+        return getattr(audio_cfg, "output_sample_rate", 24000)
+
+    def _inference_settings(self):
+        cfg = self.model.config
+        keys = ("temperature", "length_penalty", "repetition_penalty", "top_k", "top_p")
+        return {k: getattr(cfg, k) for k in keys if hasattr(cfg, k)}
+
+    def windows_for(self, seg):
+        label = seg.get('voice_label') or "default"
+        if label not in self.windows:
+            self.windows[label] = speaker_windows(self.audio_source, seg)
+        return self.windows[label]
+
+    def latents_for(self, seg):
+        """Conditioning for the segment's speaker, computed on first use."""
+        label = seg.get('voice_label') or "default"
+        if label not in self._latents:
+            self._latents[label] = self._compute(label, seg)
+        return self._latents[label]
+
+    def _compute(self, label, seg):
+        import torch
+        from audio_source import write_wav
+
+        windows = self.windows_for(seg)
+        paths = []
+        for k, (start, dur) in enumerate(windows):
+            path = os.path.join(self._scratch, f"{label}_{k}.wav")
+            write_wav(path, self.audio_source.slice(start, dur), self.audio_source.sample_rate)
+            paths.append(path)
+
+        cfg = self.model.config
+        t0 = time.perf_counter()
+        with torch.inference_mode():
+            latents = self.model.get_conditioning_latents(
+                audio_path=paths,
+                gpt_cond_len=getattr(cfg, "gpt_cond_len", 12),
+                gpt_cond_chunk_len=getattr(cfg, "gpt_cond_chunk_len", 4),
+                max_ref_length=getattr(cfg, "max_ref_len", 10),
+                sound_norm_refs=getattr(cfg, "sound_norm_refs", False))
+        elapsed = time.perf_counter() - t0
+        self.cond_time += elapsed
+        self.cond_count += 1
+
+        total = sum(d for _, d in windows)
+        print(f"   > Speaker '{label}': {len(windows)} reference windows ({total:.1f}s), latents in {elapsed:.2f}s")
+        return latents
+
+    def synthesize(self, text, language, seg):
+        """float32 mono at output_sample_rate."""
+        import torch
+        gpt_cond_latent, speaker_embedding = self.latents_for(seg)
+
+        t0 = time.perf_counter()
+        with torch.inference_mode():
+            out = self.model.inference(text, language, gpt_cond_latent, speaker_embedding,
+                                       enable_text_splitting=True, **self._inference_settings())
+        self.synth_time += time.perf_counter() - t0
+        self.synth_count += 1
+
+        wav = out["wav"]
+        if hasattr(wav, "cpu"): wav = wav.cpu().numpy()
+        return np.asarray(wav, dtype=np.float32).reshape(-1)
+
+    def report(self):
+        """Per-segment latency saved by reusing latents instead of recomputing them."""
+        if not self.synth_count or not self.cond_count: return
+        per_cond = self.cond_time / self.cond_count
+        per_seg = self.synth_time / self.synth_count
+        saved = per_cond * max(self.synth_count - self.cond_count, 0)
+        pct = 100.0 * per_cond / (per_cond + per_seg) if per_cond + per_seg > 0 else 0.0
+        print(f"   > Speaker cache: {self.cond_count} speaker(s), {self.synth_count} segments. "
+              f"Conditioning {per_cond:.2f}s (once per speaker), TTS {per_seg:.2f}s/segment. "
+              f"Saved ~{per_cond:.2f}s/segment ({pct:.0f}%), ~{saved:.1f}s total")
+
+    def close(self):
+        self._latents.clear()
+        shutil.rmtree(self._scratch, ignore_errors=True)
@@ -0,0 +1,102 @@
+import queue
+import threading
+
+# Helpers for running pipeline stages (transcribe -> translate -> dub) as
+# overlapping generators instead of waiting for full lists.
+
+_DONE = object()
+
+class Prefetch:
+    """
+    Drains an iterable on a background thread into a bounded queue.
+    The producer starts immediately, so the upstream stage keeps working while
+    the downstream stage is busy. Exceptions are re-raised in the consumer.
+    """
+    def __init__(self, iterable, maxsize=32, name="prefetch"):
+        self._queue = queue.Queue(maxsize)
+        self._stop = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._run, args=(iterable,), name=name, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, iterable):
+        try:
+            for item in iterable:
+                if not self._put((item, None)): return
+            self._put((_DONE, None))
+        except BaseException as e:
+            self._put((_DONE, e))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished: raise StopIteration
+        item, error = self._queue.get()
+        if item is _DONE:
+            self._finished = True
+            if error is not None: raise error
+            raise StopIteration
+        return item
+
+    def close(self):
+        """Stops the producer (e.g. when the consumer fails half-way)."""
+        self._stop.set()
+        self._finished = True
+
+def prefetch(iterable, maxsize=32, name="prefetch"):
+    return Prefetch(iterable, maxsize=maxsize, name=name)
+
+def tee_into(iterable, sink):
+    """Passes items through while appending them to `sink` (e.g. for the SRT step)."""
+    for item in iterable:
+        sink.append(item)
+        yield item
+
+def serialized(iterable, lock):
+    """Pulls each item while holding `lock` (a model shared by concurrent jobs runs one call at a time)."""
+    it = iter(iterable)
+    while True:
+        with lock:
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+class Channel:
+    """
+    Unbounded hand-off from a producer that may finish long before its consumer starts
+    (a stage publishing a stream early). close(error) ends the stream; errors are
+    re-raised in the consumer.
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._finished = False
+
+    def put(self, item):
+        self._queue.put((item, None))
+
+    def close(self, error=None):
+        self._queue.put((_DONE, error))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished: raise StopIteration
+        item, error = self._queue.get()
+        if item is _DONE:
+            self._finished = True
+            if error is not None: raise error
+            raise StopIteration
+        return item
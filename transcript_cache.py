@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# On-disk transcript cache (content-addressed, size-bounded LRU).
+# Re-rendering the same source with different blur/subtitle/Docu-Mix toggles
+# skips Whisper entirely.
+
+DEFAULT_MAX_MB = 512
+CACHE_VERSION = 1
+
+def cache_dir_for(model_dir):
+    return os.path.join(model_dir, "cache", "transcripts")
+
+def make_key(audio_hash, model_name, language, initial_prompt, chunking="whole"):
+    """Key = audio stream hash + Whisper model + language + the exact priming prompt + chunking mode."""
+    raw = json.dumps([CACHE_VERSION, audio_hash, model_name, language, initial_prompt, chunking])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class TranscriptCache:
+    def __init__(self, cache_dir, max_mb=DEFAULT_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Returns a fresh copy of the cached segments, or None."""
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                os.utime(path, None)  # LRU: last use = mtime
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry["segments"]
+
+    def put(self, key, segments, meta=None):
+        entry = {"meta": meta or {}, "created": time.time(), "segments": segments}
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(entry, f, ensure_ascii=False)
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"   > Transcript cache write failed: {e}")
+                if os.path.exists(tmp): os.remove(tmp)
+                return
+            self._evict()
+
+    def _evict(self):
+        """Drops least-recently-used entries until the cache fits max_bytes."""
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in sorted(files, key=lambda x: x[2]):
+            if total <= self.max_bytes: break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def _files(self):
+        out = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"): continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            out.append((path, st.st_size, st.st_mtime))
+        return out
+
+    # --- Inspect / Clear ---
+    def entries(self):
+        """List of {key, size, last_used, meta} for every cached transcript, most recent first."""
+        out = []
+        for path, size, mtime in sorted(self._files(), key=lambda x: -x[2]):
+            meta = {}
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    meta = json.load(f).get("meta", {})
+            except (OSError, ValueError):
+                pass
+            out.append({
+                "key": os.path.basename(path)[:-5],
+                "size": size,
+                "last_used": mtime,
+                "meta": meta
+            })
+        return out
+
+    def stats(self):
+        files = self._files()
+        return {
+            "entries": len(files),
+            "bytes": sum(size for _, size, _ in files),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in self._files():
+                try: os.remove(path)
+                except OSError: pass
+
+if __name__ == "__main__":
+    import argparse
+    from settings import SettingsManager
+
+    parser = argparse.ArgumentParser(description="Inspect or clear the ReFlow transcript cache")
+    parser.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    cache = TranscriptCache(cache_dir_for(SettingsManager().get("model_dir")))
+    if args.clear:
+        cache.clear()
+        print("--- Transcript cache cleared ---")
+    else:
+        for e in cache.entries():
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(e["last_used"]))
+            print(f"{e['key'][:12]}  {e['size'] / 1024:8.1f} KB  {when}  {e['meta'].get('source', '')}")
+        st = cache.stats()
+        print(f"   > {st['entries']} entries, {st['bytes'] / 1024 / 1024:.1f} / {st['max_bytes'] / 1024 / 1024:.0f} MB")
@@ -2,11 +2,27 @@ from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import torch
 import re
 import gc
+import os
+import glob
+from functools import lru_cache
+import model_manager
+import translation_memory
 
 # --- CONFIG ---
 MODEL_CHECKPOINT = "facebook/nllb-200-distilled-600M"
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
+# Engines: "torch" (fp32/CUDA, original), "int8" (torch dynamic quantization, CPU),
+# "onnx" (ONNX Runtime export, int8-quantized, CPU). See export_onnx_model().
+ENGINES = ("torch", "int8", "onnx")
+
+def onnx_dir_for(model_dir):
+    return os.path.join(model_dir, "nllb-200-distilled-600M-onnx")
+
+# Batched translation: padded source tokens per generate() call, and a hard cap on rows
+BATCH_TOKENS = 4096
+MAX_BATCH = 64
+
 # --- Hinglish Protection List ---
 DEFAULT_TECH_TERMS = [
     "Settings", "Update", "Install", "Download", "Upload", "Click", "Tap",
@@ -19,10 +35,25 @@ DEFAULT_TECH_TERMS = [
 ]
 
 class NLLBTranslator:
-    def __init__(self):
-        print(f"--- Loading NLLB Model on {device.upper()} ---")
-        self.tokenizer = AutoTokenizer.from_pretrained(MODEL_CHECKPOINT)
-        self.model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_CHECKPOINT).to(device)
+    def __init__(self, engine="torch", model_dir="models"):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown translation engine: {engine}")
+        self.engine = engine
+        self.device = device if engine == "torch" else "cpu"
+        print(f"--- Loading NLLB Model on {self.device.upper()} ({engine}) ---")
+
+        if engine == "onnx":
+            onnx_dir = onnx_dir_for(model_dir)
+            if not glob.glob(os.path.join(onnx_dir, "*.onnx")):
+                export_onnx_model(onnx_dir)
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+            self.tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+            self.model = ORTModelForSeq2SeqLM.from_pretrained(onnx_dir)
+        else:
+            self.tokenizer = AutoTokenizer.from_pretrained(MODEL_CHECKPOINT)
+            self.model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_CHECKPOINT).to(self.device)
+            if engine == "int8":
+                self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
         # NLLB requires specific language codes:
         # Hindi = hin_Deva, English = eng_Latn
         self.lang_code_map = {
@@ -33,7 +64,7 @@ class NLLBTranslator:
     def translate(self, text, target_lang='hindi'):
         flores_code = self.lang_code_map.get(target_lang, 'hin_Deva')
         
-        inputs = self.tokenizer(text, return_tensors="pt").to(device)
+        inputs = self.tokenizer(text, return_tensors="pt").to(self.device)
         
         # --- FIX: Updated command for newer Transformers versions ---
         # Old: self.tokenizer.lang_code_to_id[flores_code] (Deprecated)
@@ -48,61 +79,301 @@ class NLLBTranslator:
         )
         return self.tokenizer.batch_decode(translated_tokens, skip_special_tokens=True)[0]
 
+    def translate_batch(self, texts, target_lang='hindi', max_tokens=BATCH_TOKENS, max_batch=MAX_BATCH):
+        """
+        Length-bucketed batch translation. Texts are sorted by token length and packed
+        into padded batches of at most max_tokens (rows x longest row), one generate()
+        call per batch. Results come back in the original order.
+        """
+        if not texts: return []
+        flores_code = self.lang_code_map.get(target_lang, 'hin_Deva')
+        forced_bos_id = self.tokenizer.convert_tokens_to_ids(flores_code)
+
+        token_ids = self.tokenizer(list(texts))["input_ids"]
+        order = sorted(range(len(texts)), key=lambda i: len(token_ids[i]))
+
+        results = [None] * len(texts)
+        for batch in _pack_batches(order, token_ids, max_tokens, max_batch):
+            inputs = self.tokenizer.pad({"input_ids": [token_ids[i] for i in batch]}, return_tensors="pt").to(self.device)
+            with torch.no_grad():
+                translated_tokens = self.model.generate(
+                    **inputs,
+                    forced_bos_token_id=forced_bos_id,
+                    max_length=128
+                )
+            decoded = self.tokenizer.batch_decode(translated_tokens, skip_special_tokens=True)
+            for i, text in zip(batch, decoded):
+                results[i] = text
+        return results
+
     def unload(self):
-        """Free up VRAM for the next model (XTTS)"""
+        """Free up VRAM for the next model (called by the Model Manager on eviction)"""
         del self.model
         del self.tokenizer
         gc.collect()
         torch.cuda.empty_cache()
 
+def export_onnx_model(out_dir, quantize=True):
+    """
+    One-time conversion: exports NLLB to ONNX (needs 'optimum[onnxruntime]') and,
+    by default, int8 dynamic-quantizes every graph with onnxruntime.
+    """
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    print(f"--- Exporting NLLB to ONNX: {out_dir} (one-time) ---")
+    os.makedirs(out_dir, exist_ok=True)
+    ORTModelForSeq2SeqLM.from_pretrained(MODEL_CHECKPOINT, export=True).save_pretrained(out_dir)
+    AutoTokenizer.from_pretrained(MODEL_CHECKPOINT).save_pretrained(out_dir)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        for path in glob.glob(os.path.join(out_dir, "*.onnx")):
+            print(f"   > Quantizing {os.path.basename(path)} (int8)")
+            tmp = path + ".int8"
+            quantize_dynamic(path, tmp, weight_type=QuantType.QInt8)
+            os.replace(tmp, path)
+    return out_dir
+
 # --- Helper Functions ---
-def mask_text(text, terms):
-    mask_map = {}
-    masked_text = text
-    sorted_terms = sorted(terms, key=len, reverse=True)
-    
-    for i, term in enumerate(sorted_terms):
-        pattern = re.compile(r'\b' + re.escape(term) + r'\b', re.IGNORECASE)
-        if pattern.search(masked_text):
+def _pack_batches(order, token_ids, max_tokens, max_batch):
+    """Greedy packing of length-sorted indices under a padded-token budget."""
+    batch = []
+    for i in order:
+        longest = len(token_ids[i])  # sorted ascending, so the newest row is the longest
+        if batch and ((len(batch) + 1) * longest > max_tokens or len(batch) >= max_batch):
+            yield batch
+            batch = []
+        batch.append(i)
+    if batch: yield batch
+
+# --- Hinglish Term Protection ---
+# Placeholders come back from NLLB either intact or with '_' turned into spaces.
+_PLACEHOLDER_RE = re.compile(r'__ID_(\d+)__|  ID (\d+)  ')
+
+def _trie_regex(words):
+    """
+    Builds one regex matching any of `words` from a character trie, e.g.
+    ['app', 'apple', 'api'] -> 'ap(?:i|p(?:le)?)'. Matching cost depends on the
+    word length, not on how many words there are. Longer words are preferred.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        end = '' in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != '']
+        if not branches: return ''
+        if len(branches) == 1 and not end: return branches[0]
+        body = '(?:' + '|'.join(branches) + ')'
+        return body + '?' if end else body
+
+    return build(trie)
+
+class TermMasker:
+    """
+    Compiled once per term list. Masks a segment in a single regex pass and
+    restores placeholders in a single pass. Output matches the old
+    one-regex-per-term loop (longest term wins, placeholder = index in the
+    length-sorted list, case-insensitive whole-word matches).
+    """
+    def __init__(self, terms):
+        self.sorted_terms = sorted(terms, key=len, reverse=True)
+        self.index = {}
+        for i, term in enumerate(self.sorted_terms):
+            if term: self.index.setdefault(term.lower(), i)
+
+        words = [t for t in self.index]
+        self.pattern = re.compile(r'\b(?:' + _trie_regex(words) + r')\b', re.IGNORECASE) if words else None
+
+    def _lookup(self, matched):
+        i = self.index.get(matched.lower())
+        if i is None:
+            # Case pairs that lower() doesn't map 1:1 (rare): first term that matches wins
+            i = next(j for j, t in enumerate(self.sorted_terms)
+                     if t and re.fullmatch(re.escape(t), matched, re.IGNORECASE))
+        return i
+
+    def mask(self, text):
+        mask_map = {}
+        if self.pattern is None: return text, mask_map
+
+        def replace(m):
+            i = self._lookup(m.group(0))
             placeholder = f"__ID_{i}__"
-            masked_text = pattern.sub(placeholder, masked_text)
-            mask_map[placeholder] = term
-    return masked_text, mask_map
+            mask_map[placeholder] = self.sorted_terms[i]
+            return placeholder
+
+        return self.pattern.sub(replace, text), mask_map
+
+@lru_cache(maxsize=8)
+def _cached_masker(terms):
+    return TermMasker(terms)
+
+def get_term_masker(terms):
+    return _cached_masker(tuple(terms))
+
+def mask_text(text, terms):
+    return get_term_masker(terms).mask(text)
 
 def unmask_text(text, mask_map):
-    for placeholder, term in mask_map.items():
-        text = text.replace(placeholder, term)
-        text = text.replace(placeholder.replace("_", " "), term)
-    return text
+    if not mask_map: return text
 
-def translate_segments(segments, target_mode='hindi', tech_terms=None):
-    if tech_terms is None: tech_terms = DEFAULT_TECH_TERMS
-    
-    # Init Model
-    translator = NLLBTranslator()
-    
-    print(f"--- NLLB Translating {len(segments)} lines. Mode: {target_mode.upper()} ---")
-    
-    translated_segments = []
+    def restore(m):
+        placeholder = f"__ID_{m.group(1) or m.group(2)}__"
+        return mask_map.get(placeholder, m.group(0))
+
+    return _PLACEHOLDER_RE.sub(restore, text)
+
+def _prepare(seg, target_mode, masker):
+    """Returns (text to feed NLLB, NLLB target, mask_map or None)."""
+    if target_mode == 'hinglish':
+        masked, mask_map = masker.mask(seg['text'])
+        return masked, 'hindi', mask_map
+    target = 'english' if target_mode == 'english' else 'hindi'
+    return seg['text'], target, None
+
+def _translate_texts(translator, texts, target, batch_tokens):
+    """Batched translation with the old per-segment path as fallback. Failed items are None."""
+    try:
+        return translator.translate_batch(texts, target_lang=target, max_tokens=batch_tokens)
+    except Exception as e:
+        print(f"NLLB Batch Error: {e} (retrying line by line)")
+
+    results = []
+    for text in texts:
+        try:
+            results.append(translator.translate(text, target_lang=target))
+        except Exception as e:
+            print(f"NLLB Error: {e}")
+            results.append(None)
+    return results
+
+class _LazyTranslator:
+    """Acquires NLLB from the Model Manager only when a line actually needs the model."""
+    def __init__(self, engine="torch", model_dir="models"):
+        self.engine = engine
+        self.model_dir = model_dir
+        self.key = f"nllb:{engine}"
+        self._translator = None
+
+    def get(self):
+        if self._translator is None:
+            self._translator = model_manager.get_manager().acquire(
+                self.key, lambda: NLLBTranslator(self.engine, self.model_dir))
+        return self._translator
+
+    def release(self):
+        if self._translator is not None:
+            model_manager.get_manager().release(self.key)
+            self._translator = None
+
+def _translate_many(lazy, segments, target_mode, tech_terms, batch_tokens=BATCH_TOKENS, memory=None):
+    # 1. Translation memory: one bulk lookup before any model work
+    keys = []
     for seg in segments:
+        keys.append(translation_memory.normalize(seg['text']))
+
+    known = {}
+    # Quantized engines don't give byte-identical output, so they get their own entries
+    checkpoint = MODEL_CHECKPOINT if lazy.engine == "torch" else f"{MODEL_CHECKPOINT}:{lazy.engine}"
+    tm_args = (target_mode, checkpoint, translation_memory.terms_hash(tech_terms))
+    if memory is not None:
+        known = memory.lookup_many(keys, *tm_args)
+
+    # 2. Only misses go to NLLB, each distinct line once
+    todo = {}
+    for seg, key in zip(segments, keys):
+        if key not in known and key not in todo:
+            todo[key] = seg
+
+    masker = get_term_masker(tech_terms) if target_mode == 'hinglish' else None
+    prepared = {}
+    for key, seg in todo.items():
         try:
-            new_seg = seg.copy()
-            original_text = seg['text']
-            
-            if target_mode == 'hinglish':
-                masked, mask_map = mask_text(original_text, tech_terms)
-                trans_text = translator.translate(masked, target_lang='hindi')
-                final_text = unmask_text(trans_text, mask_map)
-                new_seg['text'] = final_text
-            else:
-                target = 'english' if target_mode == 'english' else 'hindi'
-                new_seg['text'] = translator.translate(original_text, target_lang=target)
-                
-            translated_segments.append(new_seg)
+            prepared[key] = _prepare(seg, target_mode, masker)
         except Exception as e:
             print(f"NLLB Error: {e}")
-            translated_segments.append(seg)
+
+    # One batched call per NLLB target language
+    fresh = {}
+    for target in set(p[1] for p in prepared.values()):
+        batch_keys = [k for k, p in prepared.items() if p[1] == target]
+        # NLLB is shared by concurrent jobs: one translation call at a time
+        with model_manager.get_manager().lock(lazy.key):
+            outputs = _translate_texts(lazy.get(), [prepared[k][0] for k in batch_keys], target, batch_tokens)
+        for key, out in zip(batch_keys, outputs):
+            if out is None: continue
+            mask_map = prepared[key][2]
+            fresh[key] = unmask_text(out, mask_map) if mask_map is not None else out
+
+    if memory is not None and fresh:
+        memory.store_many(fresh.items(), *tm_args)
+    known.update(fresh)
+
+    results = []
+    for seg, key in zip(segments, keys):
+        if key not in known:
+            results.append(seg)  # Keep the original line on error
+            continue
+        new_seg = seg.copy()
+        new_seg['text'] = known[key]
+        results.append(new_seg)
+    return results
+
+def iter_translate_segments(segments, target_mode='hindi', tech_terms=None,
+                            batch_tokens=BATCH_TOKENS, window=16, memory=None,
+                            engine="torch", model_dir="models"):
+    """
+    Streaming version of translate_segments. `segments` can be any iterable
+    (e.g. iter_transcribe); translated segments are yielded in the same order.
+    Segments are translated in windows of `window` lines so batching still applies.
+    memory: Optional TranslationMemory (only misses are sent to NLLB).
+    engine: "torch", "int8" or "onnx" (see ENGINES).
+    """
+    if tech_terms is None: tech_terms = DEFAULT_TECH_TERMS
+    
+    # Model stays resident in the Model Manager between videos (evicted only if over budget)
+    lazy = _LazyTranslator(engine, model_dir)
+    print(f"--- NLLB Translating (Streaming). Mode: {target_mode.upper()} ---")
+    try:
+        pending = []
+        for seg in segments:
+            pending.append(seg)
+            if len(pending) >= window:
+                yield from _translate_many(lazy, pending, target_mode, tech_terms, batch_tokens, memory)
+                pending = []
+        if pending:
+            yield from _translate_many(lazy, pending, target_mode, tech_terms, batch_tokens, memory)
+    finally:
+        lazy.release()
+
+def translate_segments(segments, target_mode='hindi', tech_terms=None, batch_tokens=BATCH_TOKENS, memory=None,
+                       engine="torch", model_dir="models"):
+    if tech_terms is None: tech_terms = DEFAULT_TECH_TERMS
+    
+    # Model stays resident in the Model Manager between videos (evicted only if over budget)
+    lazy = _LazyTranslator(engine, model_dir)
+    print(f"--- NLLB Translating {len(segments)} lines. Mode: {target_mode.upper()} ---")
+    try:
+        translated_segments = _translate_many(lazy, segments, target_mode, tech_terms, batch_tokens, memory)
+    finally:
+        lazy.release()
     
-    # Unload to save GPU for Dubbing
-    translator.unload()
-    return translated_segments
\ No newline at end of file
+    return translated_segments
+
+if __name__ == "__main__":
+    import argparse
+    from settings import SettingsManager
+
+    parser = argparse.ArgumentParser(description="NLLB engine tools")
+    parser.add_argument("--export-onnx", action="store_true", help="one-time ONNX export + int8 quantization")
+    parser.add_argument("--no-quantize", action="store_true")
+    args = parser.parse_args()
+
+    if args.export_onnx:
+        export_onnx_model(onnx_dir_for(SettingsManager().get("model_dir")), quantize=not args.no_quantize)
+    else:
+        parser.print_help()
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+# Persistent translation memory (SQLite). Repeated lines (intros, outros,
+# "click subscribe", UI instructions) are translated once and reused across
+# the whole queue. Only misses go to NLLB.
+
+def db_path_for(model_dir):
+    return os.path.join(model_dir, "cache", "translation_memory.sqlite")
+
+def normalize(text):
+    """Lookup form of a source line: NFC, collapsed whitespace, case-folded."""
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+def terms_hash(terms):
+    joined = "\n".join(sorted(set(t.strip() for t in (terms or []) if t and t.strip())))
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()
+
+class TranslationMemory:
+    # SQLite's default limit on bound variables is 999
+    _IN_CHUNK = 500
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS tm (
+                source TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                model TEXT NOT NULL,
+                terms_hash TEXT NOT NULL,
+                target TEXT NOT NULL,
+                uses INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (source, mode, model, terms_hash)
+            );
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        self._conn.commit()
+        # Counters for this session; lifetime totals live in the 'counters' table
+        self.hits = 0
+        self.misses = 0
+
+    def lookup_many(self, sources, mode, model, terms_digest):
+        """Bulk lookup of normalized source lines. Returns {source: target} for the hits."""
+        unique = list(dict.fromkeys(sources))
+        found = {}
+        with self._lock:
+            for a in range(0, len(unique), self._IN_CHUNK):
+                chunk = unique[a:a + self._IN_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT source, target FROM tm WHERE mode=? AND model=? AND terms_hash=? AND source IN ({marks})",
+                    [mode, model, terms_digest] + chunk).fetchall()
+                found.update(rows)
+            if found:
+                self._conn.executemany(
+                    "UPDATE tm SET uses = uses + 1 WHERE source=? AND mode=? AND model=? AND terms_hash=?",
+                    [(src, mode, model, terms_digest) for src in found])
+            self._count(len(found), len(unique) - len(found))
+            self._conn.commit()
+        return found
+
+    def store_many(self, pairs, mode, model, terms_digest):
+        """pairs: iterable of (normalized source, translated text)."""
+        rows = [(src, mode, model, terms_digest, tgt) for src, tgt in pairs if src and tgt]
+        if not rows: return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tm (source, mode, model, terms_hash, target) VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def _count(self, hits, misses):
+        self.hits += hits
+        self.misses += misses
+        self._conn.executemany(
+            "INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            [("hits", hits), ("misses", misses)])
+
+    # --- Inspect ---
+    def stats(self):
+        with self._lock:
+            totals = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            entries = self._conn.execute("SELECT COUNT(*) FROM tm").fetchone()[0]
+        lookups = self.hits + self.misses
+        total_lookups = totals.get("hits", 0) + totals.get("misses", 0)
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "total_hits": totals.get("hits", 0),
+            "total_misses": totals.get("misses", 0),
+            "total_hit_rate": totals.get("hits", 0) / total_lookups if total_lookups else 0.0
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM tm")
+            self._conn.execute("DELETE FROM counters")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,88 +1,252 @@
 from transformers import pipeline
 from PIL import Image
-import cv2
+from frame_source import iter_sampled_frames, dhash, hamming
 import os
 import subprocess
+import shutil
+import tempfile
 import torch
+import model_manager
 
-# --- GLOBAL LOADER ---
-_classifier = None
+NSFW_MODEL_ID = "Falconsai/nsfw_image_detection"
+
+# --- LOADER (resident in the Model Manager) ---
+def _load_classifier():
+    print("   > Loading Vision Transformer (HuggingFace)...")
+    device = 0 if torch.cuda.is_available() else -1
+    try:
+        return pipeline("image-classification", model=NSFW_MODEL_ID, device=device)
+    except Exception as e:
+        print(f"   > Error loading model: {e}")
+        return None
 
 def get_classifier():
-    global _classifier
-    if _classifier is None:
-        print("   > Loading Vision Transformer (HuggingFace)...")
-        device = 0 if torch.cuda.is_available() else -1
+    """Unpinned handle (benchmarks); scans hold the classifier with use_classifier()."""
+    return model_manager.get_manager().get("nsfw", _load_classifier, unloader=None)
+
+def use_classifier():
+    """Pins the classifier for a whole scan, so a concurrent load can't evict it mid-scan."""
+    return model_manager.get_manager().use("nsfw", _load_classifier, unloader=None)
+
+BATCH_SIZE = 16          # Frames per forward pass
+NSFW_THRESHOLD = 0.60    # LOWER THRESHOLD: 0.60 (Catch the "Flickering" frames)
+GAP_LIMIT = 4.0          # Seconds: closer detections are merged into one blur block
+PADDING = 1.0            # Seconds of blur before/after each detection
+
+def _nsfw_index(model):
+    for idx, label in model.config.id2label.items():
+        if label == 'nsfw': return int(idx)
+    return None
+
+def classify_frames(classifier, images):
+    """
+    NSFW score for each PIL image, in one forward pass.
+    Same preprocessing and softmax as calling the pipeline per image. The classifier is
+    shared by concurrent jobs: one forward pass at a time.
+    """
+    model_lock = model_manager.get_manager().lock("nsfw")
+    processor = getattr(classifier, "image_processor", None) or getattr(classifier, "feature_extractor", None)
+    model = getattr(classifier, "model", None)
+    if processor is None or model is None:
+        # Unknown classifier object: let the pipeline batch it
+        with model_lock:
+            results = classifier(images, batch_size=len(images))
+        return [next((r['score'] for r in res if r['label'] == 'nsfw'), 0) for res in results]
+
+    idx = _nsfw_index(model)
+    if idx is None: return [0] * len(images)
+    inputs = processor(images=images, return_tensors="pt")
+    inputs = {k: v.to(model.device) for k, v in inputs.items()}
+    with model_lock, torch.inference_mode():
+        logits = model(**inputs).logits
+    return logits.float().softmax(dim=-1)[:, idx].cpu().tolist()
+
+SCAN_MODES = ("fixed", "adaptive", "parallel")
+FRAME_INTERVAL = 6       # Fixed scan: every 6th frame (~0.25 seconds)
+COARSE_INTERVAL = 24     # Adaptive scan: coarse pass (~1 second)
+REFINE_THRESHOLD = 0.45  # Coarse frames scoring above this get a dense re-scan around them
+HASH_DISTANCE = 4        # dHash bits: at or below this a frame counts as unchanged
+MAX_SKIP = 10            # ...but classify at least every 10th coarse frame anyway
+
+class _BatchClassifier:
+    """
+    Queues (key, PIL image) and classifies in batches. scores[key] = nsfw score; keys
+    the classifier failed on have no score (and are counted in `failed`).
+    """
+    def __init__(self, classifier, batch_size):
+        self.classifier = classifier
+        self.batch_size = max(batch_size, 1)
+        self.batch = []
+        self.scores = {}
+        self.classified = 0
+        self.failed = 0
+
+    def add(self, key, rgb_frame):
+        self.batch.append((key, Image.fromarray(rgb_frame)))
+        if len(self.batch) >= self.batch_size: self.flush()
+
+    def flush(self):
+        if not self.batch: return
         try:
-            _classifier = pipeline("image-classification", model="Falconsai/nsfw_image_detection", device=device)
+            scores = classify_frames(self.classifier, [img for _, img in self.batch])
+            for (key, _), nsfw_score in zip(self.batch, scores):
+                self.scores[key] = nsfw_score
+            self.classified += len(self.batch)
         except Exception as e:
-            print(f"   > Error loading model: {e}")
-            return None
-    return _classifier
-
-def scan_video_for_content(video_path):
-    print(f"--- Scanning with Continuity Logic: {video_path} ---")
-    classifier = get_classifier()
-    if not classifier: return []
-
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    if fps == 0: fps = 24.0
-    
-    # SCAN FASTER: Check every 6th frame (~0.25 seconds)
-    frame_interval = 6 
-    timestamps = []
-    
-    count = 0
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret: break
-        
-        if count % frame_interval == 0:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_image = Image.fromarray(rgb_frame)
-            
-            try:
-                results = classifier(pil_image)
-                nsfw_score = 0
-                for r in results:
-                    if r['label'] == 'nsfw':
-                        nsfw_score = r['score']
-                        break
-                
-                # LOWER THRESHOLD: 0.60 (Catch the "Flickering" frames)
-                if nsfw_score > 0.60:
-                    time_sec = count / fps
-                    timestamps.append(time_sec)
-                    # print(f"   > [UNSAFE] Confidence: {nsfw_score:.2f} at {time_sec:.2f}s")
-                    
-            except Exception as e:
-                pass
-
-        count += 1
-        
-    cap.release()
-    return merge_timestamps_with_gap_filling(timestamps)
+            # One bad frame shouldn't cost the whole batch its scores: retry them one by one
+            print(f"   > Classifier error on a batch of {len(self.batch)}, retrying per frame: {e}")
+            failed = 0
+            for key, img in self.batch:
+                try:
+                    self.scores[key] = classify_frames(self.classifier, [img])[0]
+                    self.classified += 1
+                except Exception as e:
+                    failed += 1
+                    print(f"   > Classifier error on frame {key}, skipped: {e}")
+            if failed: print(f"   > {failed} of {len(self.batch)} frames skipped")
+            self.failed += failed
+        self.batch = []
+
+def detections(pairs, threshold=NSFW_THRESHOLD):
+    """Timestamps of the (time, score) pairs above the threshold."""
+    return [t for t, score in pairs if score > threshold]
+
+# The scans return (pairs, unscored): (time, score) for every sampled frame that got a
+# score, and how many sampled frames the classifier failed on. Unscored frames are left
+# out rather than read as 0 -- "safe" -- so an incomplete scan is never mistaken for one.
 
-def merge_timestamps_with_gap_filling(timestamps):
+def _scan_fixed(classifier, video_path, batch_size=BATCH_SIZE, decoder="ffmpeg"):
+    """Every frame of the fixed-interval scan."""
+    clf = _BatchClassifier(classifier, batch_size)
+    times = {}
+    for frame_idx, time_sec, rgb_frame in iter_sampled_frames(video_path, FRAME_INTERVAL, decoder=decoder):
+        times[frame_idx] = time_sec
+        clf.add(frame_idx, rgb_frame)
+    clf.flush()
+    return [(times[k], clf.scores[k]) for k in sorted(times) if k in clf.scores], clf.failed
+
+def _scan_adaptive(classifier, video_path, batch_size=BATCH_SIZE, decoder="ffmpeg"):
+    """
+    Every frame the coarse-to-fine scan looked at (hash-skipped frames carry the score
+    of the frame they matched).
+    1. Coarse pass every COARSE_INTERVAL frames; frames whose dHash is close to the last
+       classified frame reuse its score instead of being classified.
+    2. Every coarse frame near/above the threshold gets a dense pass (FRAME_INTERVAL)
+       over the surrounding coarse step, on the same frame grid as the fixed scan.
+    """
+    clf = _BatchClassifier(classifier, batch_size)
+    coarse = []   # [frame index, time, key whose score applies]
+    last_hash, last_key, skipped = None, None, 0
+    for frame_idx, time_sec, rgb_frame in iter_sampled_frames(video_path, COARSE_INTERVAL, decoder=decoder):
+        h = dhash(rgb_frame)
+        if last_hash is not None and skipped < MAX_SKIP and hamming(h, last_hash) <= HASH_DISTANCE:
+            coarse.append((frame_idx, time_sec, last_key))
+            skipped += 1
+            continue
+        clf.add(frame_idx, rgb_frame)
+        coarse.append((frame_idx, time_sec, frame_idx))
+        last_hash, last_key, skipped = h, frame_idx, 0
+    clf.flush()
+    n_coarse = len(coarse)
+    n_coarse_classified = clf.classified
+
+    # 2. Dense re-scan around suspicious coarse frames (overlapping ranges merged)
+    ranges = []
+    for frame_idx, _, key in coarse:
+        if clf.scores.get(key, 0) < REFINE_THRESHOLD: continue
+        a, b = max(frame_idx - COARSE_INTERVAL, 0), frame_idx + COARSE_INTERVAL + 1
+        if ranges and a <= ranges[-1][1]: ranges[-1][1] = max(ranges[-1][1], b)
+        else: ranges.append([a, b])
+
+    times = {frame_idx: time_sec for frame_idx, time_sec, _ in coarse}
+    score_of = {frame_idx: key for frame_idx, _, key in coarse}
+    dense = []
+    for a, b in ranges:
+        for frame_idx, time_sec, rgb_frame in iter_sampled_frames(video_path, FRAME_INTERVAL, decoder=decoder,
+                                                                  start_frame=a, end_frame=b):
+            if frame_idx in clf.scores: continue
+            times[frame_idx] = time_sec
+            score_of[frame_idx] = frame_idx
+            dense.append(frame_idx)
+            clf.add(frame_idx, rgb_frame)
+    clf.flush()
+
+    print(f"   > Adaptive scan: {n_coarse} coarse frames ({n_coarse - n_coarse_classified} skipped by hash), "
+          f"{len(ranges)} refined regions ({len(dense)} dense frames), {clf.classified} classified in total")
+    pairs = [(times[k], clf.scores[score_of[k]]) for k in sorted(times) if score_of[k] in clf.scores]
+    return pairs, len(times) - len(pairs)
+
+def _scan_parallel(classifier, video_path, batch_size=BATCH_SIZE, decoder="ffmpeg", workers=4, consumers=1):
+    """Fixed-interval scan, sharded by time over decoder processes (see parallel_scan)."""
+    from parallel_scan import scan_parallel
+    classify = lambda frames: classify_frames(classifier, [Image.fromarray(f) for f in frames])
+    try:
+        results, unscored = scan_parallel(video_path, classify, workers=workers, consumers=consumers,
+                                          batch_size=batch_size, frame_interval=FRAME_INTERVAL, decoder=decoder)
+    except RuntimeError as e:
+        # A lost shard would leave unscanned (= unblurred) stretches: redo it serially
+        print(f"   > Parallel scan failed ({e}), falling back to the serial scan")
+        return _scan_fixed(classifier, video_path, batch_size=batch_size, decoder=decoder)
+    # Per-shard results merged in frame order before gap filling
+    return [pair for _, pair in sorted(results.items())], unscored
+
+def score_frames(video_path, batch_size=BATCH_SIZE, decoder="ffmpeg", mode="fixed", workers=4, index=None):
+    """
+    (time, score) pairs of the scan. With a ScoreIndex, a video that was already scanned
+    with the same model and mode is read back instead of classified again.
+    """
+    import score_index
+    # The parallel scan samples the same frames as the fixed one, so they share an index entry
+    index_mode = "adaptive" if mode == "adaptive" else "fixed"
+    key = None
+    if index is not None:
+        key = score_index.make_key(score_index.content_hash(video_path), NSFW_MODEL_ID, index_mode, FRAME_INTERVAL)
+        entry = index.load(key)
+        if entry is not None:
+            print(f"   > Score index hit: {len(entry[0])} frames, no rescan")
+            return list(zip(entry[0].tolist(), entry[1].tolist()))
+
+    with use_classifier() as classifier:
+        if not classifier: return None
+        if mode == "parallel":
+            pairs, unscored = _scan_parallel(classifier, video_path, batch_size=batch_size, decoder=decoder,
+                                             workers=workers)
+        else:
+            scan = _scan_adaptive if mode == "adaptive" else _scan_fixed
+            pairs, unscored = scan(classifier, video_path, batch_size=batch_size, decoder=decoder)
+
+    # Only a complete scan goes into the index: a transient classifier error must not
+    # become a permanent "safe" reading that later runs never recheck
+    if unscored:
+        print(f"   > {unscored} frames could not be classified, scan not saved to the score index")
+    elif index is not None and pairs:
+        index.save(key, [t for t, _ in pairs], [s for _, s in pairs],
+                   meta={"source": os.path.basename(video_path), "mode": index_mode})
+    return pairs
+
+def scan_video_for_content(video_path, batch_size=BATCH_SIZE, decoder="ffmpeg", mode="fixed", workers=4,
+                           index=None, threshold=NSFW_THRESHOLD, gap=GAP_LIMIT, padding=PADDING):
+    print(f"--- Scanning with Continuity Logic ({mode}): {video_path} ---")
+    pairs = score_frames(video_path, batch_size=batch_size, decoder=decoder, mode=mode, workers=workers, index=index)
+    if not pairs: return []
+    return merge_timestamps_with_gap_filling(detections(pairs, threshold), gap_limit=gap, padding=padding)
+
+def merge_timestamps_with_gap_filling(timestamps, gap_limit=GAP_LIMIT, padding=PADDING):
     if not timestamps: return []
     
     # 1. SORT
     timestamps.sort()
     
     # 2. GAP FILLING ALGORITHM
-    # If two detections are less than 4 seconds apart, merge them.
+    # If two detections are less than 4 seconds apart (gap_limit), merge them.
     # This covers the "25s to 45s" scenario perfectly.
     
-    GAP_LIMIT = 4.0  # Seconds
-    
     merged_intervals = []
     if not timestamps: return []
 
     # Start the first block
-    current_start = max(0, timestamps[0] - 1.0)
-    current_end = timestamps[0] + 1.0
+    current_start = max(0, timestamps[0] - padding)
+    current_end = timestamps[0] + padding
     
     for i in range(1, len(timestamps)):
         t = timestamps[i]
@@ -90,15 +254,15 @@ def merge_timestamps_with_gap_filling(timestamps):
         # Calculate distance from previous detection's end (without buffer)
         prev_raw_t = timestamps[i-1]
         
-        if (t - prev_raw_t) < GAP_LIMIT:
+        if (t - prev_raw_t) < gap_limit:
             # EXTEND current block
             # If we saw nude at 25s, and now at 28s, extend the blur to cover 28s
-            current_end = t + 1.0
+            current_end = t + padding
         else:
             # CLOSE current block and start new one
             merged_intervals.append([current_start, current_end])
-            current_start = max(0, t - 1.0)
-            current_end = t + 1.0
+            current_start = max(0, t - padding)
+            current_end = t + padding
             
     # Append the last block
     merged_intervals.append([current_start, current_end])
@@ -106,25 +270,59 @@ def merge_timestamps_with_gap_filling(timestamps):
     print(f"   > Final Plan: Blurring {len(merged_intervals)} continuous scenes.")
     return merged_intervals
 
-def apply_blur_to_video(input_path, output_path, intervals):
+def _merge_intervals(intervals):
+    """Sorted, non-overlapping [start, end] list."""
+    merged = []
+    for start, end in sorted((float(a), float(b)) for a, b in intervals):
+        if end <= start: continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def write_blur_commands(path, intervals, target="boxblur@zone"):
+    """sendcmd script: the single blur instance is switched on when an interval starts and off when it ends."""
+    with open(path, "w", encoding="utf-8") as f:
+        for start, end in intervals:
+            f.write(f"{start:.3f}-{end:.3f} [enter] {target} enable 1, [leave] {target} enable 0;\n")
+    return path
+
+def apply_blur_to_video(input_path, output_path, intervals, smart=True, scratch_dir=None):
+    """
+    One boxblur instance, toggled by a sendcmd timeline. Per-frame cost stays the same
+    no matter how many intervals there are, so there's no zone cap any more.
+    smart=True re-encodes only the GOPs around the intervals (smart_render) and falls
+    back to the full encode below when the source doesn't allow it.
+    Raises RuntimeError if the blurred video can't be rendered.
+    """
     print(f"--- Applying HEAVY Blur Filters ---")
+    intervals = _merge_intervals(intervals or [])
     if not intervals: return
+    if smart:
+        from smart_render import smart_render_blur
+        if smart_render_blur(input_path, output_path, intervals, scratch_dir): return
 
-    filters = []
-    for start, end in intervals:
-        # CHANGED: Increased from 20:1 to 50:5
-        # This makes it impossible to see shapes or movement details.
-        filters.append(f"boxblur=50:5:enable='between(t,{start:.2f},{end:.2f})'")
-    
-    if len(filters) > 50:
-        print("   > Too many zones. Applying continuous heavy blur.")
-        filters = ["boxblur=50:5"]
-
-    filter_str = ",".join(filters)
-    cmd = (
-        f'ffmpeg -y -v error -i "{input_path}" '
-        f'-vf "{filter_str}" '
-        f'-c:a copy -c:v libx264 '
-        f'"{output_path}"'
-    )
-    subprocess.run(cmd, shell=True)
\ No newline at end of file
+    # The command file gets a fixed name in its own scratch dir: the filtergraph never
+    # sees the video's filename (quotes, commas, colons... would break parsing)
+    output_path = os.path.abspath(output_path)
+    work = tempfile.mkdtemp(prefix="reflow_blur_", dir=scratch_dir or os.path.dirname(output_path))
+    write_blur_commands(os.path.join(work, "blur.cmd"), intervals)
+    print(f"   > {len(intervals)} blur zones on one filter instance")
+
+    # CHANGED: Increased from 20:1 to 50:5
+    # This makes it impossible to see shapes or movement details.
+    # (ffmpeg runs in the scratch dir so the command file needs no filter-path escaping)
+    filter_str = "sendcmd=f=blur.cmd,boxblur@zone=50:5:enable=0"
+    cmd = [
+        "ffmpeg", "-y", "-v", "error", "-i", os.path.abspath(input_path),
+        "-vf", filter_str,
+        "-c:a", "copy", "-c:v", "libx264",
+        output_path
+    ]
+    try:
+        result = subprocess.run(cmd, cwd=work, capture_output=True)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Blur render failed: {result.stderr.decode(errors='replace').strip()[-500:]}")
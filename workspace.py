@@ -0,0 +1,88 @@
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Per-job scratch space. Every intermediate file of a job (decoded PCM, reference
+# clips, dub track, SRT, Docu-Mix, blurred video) lives in the job's own folder,
+# so jobs never collide -- in this process or in another one.
+
+TMPFS_DIR = "/dev/shm"
+
+def tmpfs_available():
+    return os.path.isdir(TMPFS_DIR) and os.access(TMPFS_DIR, os.W_OK)
+
+class JobWorkspace:
+    """
+    A unique scratch directory per job, removed on close().
+    tmpfs=True puts the small, hot files (PCM, WAVs, SRT) in RAM when /dev/shm exists.
+    Video-sized intermediates always go to disk: file(name, large=True).
+    """
+    def __init__(self, name="job", base_dir=None, tmpfs=False, keep=False):
+        label = re.sub(r"[^\w.-]+", "_", os.path.splitext(os.path.basename(name))[0])[:40] or "job"
+        self.prefix = f"reflow_{label}_"
+        self.keep = keep
+        self.base_dir = base_dir
+        fast_base = TMPFS_DIR if tmpfs and tmpfs_available() else base_dir
+        self.path = tempfile.mkdtemp(prefix=self.prefix, dir=fast_base)
+        self._disk_path = None if fast_base == TMPFS_DIR else self.path
+
+    @property
+    def disk_path(self):
+        """Disk-backed scratch (same as path unless path is on tmpfs)."""
+        if self._disk_path is None:
+            self._disk_path = tempfile.mkdtemp(prefix=self.prefix, dir=self.base_dir)
+        return self._disk_path
+
+    def file(self, name, large=False):
+        return os.path.join(self.disk_path if large else self.path, name)
+
+    def subdir(self, name):
+        path = os.path.join(self.path, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    # --- Context Manager ---
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.keep: return
+        for path in {self.path, self._disk_path}:
+            if path: shutil.rmtree(path, ignore_errors=True)
+
+def run_jobs(jobs, fn, max_concurrent=1, should_stop=None):
+    """
+    Runs fn(job) for every job, up to max_concurrent at a time (threads: the jobs share
+    the resident models and caches). Jobs are started in order; a job that hasn't
+    started yet is skipped once should_stop() returns True.
+    Returns {job index: result or exception} for the jobs that ran; skipped jobs are left out.
+    """
+    jobs = list(jobs)
+    results = {}
+    if max_concurrent <= 1:
+        for k, job in enumerate(jobs):
+            if should_stop and should_stop(): break
+            try: results[k] = fn(job)
+            except Exception as e: results[k] = e
+        return results
+
+    skipped = object()
+
+    def guarded(job):
+        if should_stop and should_stop(): return skipped
+        return fn(job)
+
+    print(f"--- Running {len(jobs)} jobs, {max_concurrent} at a time ---")
+    with ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="job") as pool:
+        futures = {pool.submit(guarded, job): k for k, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            k = futures[future]
+            try: result = future.result()
+            except Exception as e: result = e
+            if result is not skipped: results[k] = result
+    return results